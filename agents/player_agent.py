@@ -1,6 +1,9 @@
 import os
 import re
-from core.llm_client import LLMClient
+from core.llm_client import get_llm_client, is_system_error
+
+# Static prompts are pure functions of their key, so every agent in the process shares them
+_STATIC_PROMPTS = {}
 
 class PlayerAgent:
     def __init__(self, name, stats, personality, gender="Unknown", model_name=None):
@@ -9,16 +12,18 @@ class PlayerAgent:
         self.personality = personality
         self.gender = gender
         self.inventory = [] 
+        self.last_error = None  # API failure text from the last dialogue call, kept out of the chat
+        self._dynamic_prompt = None  # (inputs, prompt) memo for get_dynamic_prompt
         
         # --- LLM CLIENT ---
         self.provider = os.getenv("LLM_PROVIDER", "google").lower()
         self.model_name = model_name or os.getenv("LLM_MODEL", "gemini-2.0-flash")
         
-        self.llm_client = LLMClient(provider=self.provider, model_name=self.model_name)
+        self.llm_client = get_llm_client(provider=self.provider, model_name=self.model_name)
         
         print(f"[SYSTEM] PlayerAgent {self.name} ({self.gender}) initialized on {self.provider}/{self.model_name}")
 
-    def get_system_prompt(self):
+    def _build_static_prompt(self):
         """Returns the standardized English system prompt with Trilingual Support."""
         
         base_identity = f"""
@@ -32,9 +37,6 @@ class PlayerAgent:
         === ROLE: INDEPENDENT INVESTIGATOR ===
         - **You are NOT a servant.** You are a partner to the Protagonist.
         - **Autonomy:** You have your own fears, goals, and opinions. Speak up if you disagree with the plan.
-        - **Assets:**
-          - Items: {', '.join(self.inventory) if self.inventory else "None"}
-          - Skills: {', '.join([f'{k} ({v}%)' for k, v in self.stats.get('Skills', {}).items()])}
         
         === LANGUAGE RULES (MANDATORY) ===
         1. **Detect Language:** Reply in the same language the Protagonist uses.
@@ -69,47 +71,105 @@ class PlayerAgent:
             - Do not output internal thought processes.
             """
 
-    def generate_dialogue(self, user_input, narrative_state=None, memory_system=None):
-        """Generate dialogue/opinion without taking physical action."""
+    def get_static_prompt(self):
+        """
+        Stable prefix of the system prompt (identity, language rules, mode instructions).
+        Built once per (provider, character profile) and shared across sessions.
+        """
+        key = (self.provider, self.name, self.gender, self.personality, self.stats.get('Occupation'))
+        prompt = _STATIC_PROMPTS.get(key)
+        if prompt is None:
+            prompt = _STATIC_PROMPTS[key] = self._build_static_prompt()
+        return prompt
+
+    def get_dynamic_prompt(self):
+        """Assets section (items, skills); memoized on the current inventory and skills."""
+        skills = tuple(self.stats.get('Skills', {}).items())
+        key = (tuple(self.inventory), skills)
+        if self._dynamic_prompt is None or self._dynamic_prompt[0] != key:
+            self._dynamic_prompt = (key, f"""
+        === CURRENT ASSETS ===
+        - Items: {', '.join(self.inventory) if self.inventory else "None"}
+        - Skills: {', '.join([f'{k} ({v}%)' for k, v in skills])}
+        """)
+        return self._dynamic_prompt[1]
+
+    def get_system_prompt(self):
+        """Full system prompt: memoized stable prefix followed by the current assets."""
+        return self.get_static_prompt() + self.get_dynamic_prompt()
+
+    def _build_dialogue_prompt(self, user_input, narrative_state=None, memory_system=None):
+        """Builds the prompt for an in-character reply to the Protagonist."""
         memory_context = ""
         narrative_context = ""
         
         if memory_system:
-            memory_context = f" === SITUATION REPORT ===\n{memory_system.get_global_context_str()[:800]}..." 
+            memory_context = f" === SITUATION REPORT ===\n{memory_system.get_global_context_str(max_chars=800)}" 
             
         if narrative_state and len(narrative_state) > 0:
             last_event = narrative_state[-1]['description']
             narrative_context = f" === CURRENT SCENE ===\nThe Keeper describes: '{last_event}'\n"
 
-        prompt = f"""
+        return f"""
         {memory_context}
         {narrative_context}
         The Protagonist says to you: "{user_input}"
         
         Reply to the Protagonist in character, considering the current scene.
         """
-        
-        return self.llm_client.get_completion(
-            prompt, 
-            system_prompt=self.get_system_prompt()
-        )
 
-    def generate_action(self, narrative_state, memory_system=None):
-        """Generate specific action based on narrative state."""
+    def _build_action_prompt(self, narrative_state, memory_system=None):
+        """Builds the prompt asking the agent to decide on an action."""
         memory_context = ""
         if memory_system:
              # Simplified context for stability
-            memory_context = f" === SHARED MEMORY ===\n{memory_system.get_global_context_str()[:800]}..."
+            memory_context = f" === SHARED MEMORY ===\n{memory_system.get_global_context_str(max_chars=800)}"
             
         if not narrative_state:
-            prompt = f"{memory_context} The game begins. What is our plan?"
-        else:
-            # Get last event
-            last_event = narrative_state[-1]['description']
-            prompt = f"{memory_context} The Keeper (GM) describes: '{last_event}'.\n\nGiven this situation, what do you decide to do? Describe your action."
-            
+            return f"{memory_context} The game begins. What is our plan?"
+
+        # Get last event
+        last_event = narrative_state[-1]['description']
+        return f"{memory_context} The Keeper (GM) describes: '{last_event}'.\n\nGiven this situation, what do you decide to do? Describe your action."
+
+    def _dialogue_reply(self, text):
+        """Returns the reply, or None if the API failed (the error is kept in `last_error`)."""
+        if is_system_error(text):
+            self.last_error = text
+            return None
+        self.last_error = None
+        return text
+
+    def generate_dialogue(self, user_input, narrative_state=None, memory_system=None):
+        """Generate dialogue/opinion without taking physical action; None if the API failed."""
+        return self._dialogue_reply(self.llm_client.get_completion(
+            self._build_dialogue_prompt(user_input, narrative_state, memory_system),
+            system_prompt=self.get_system_prompt(),
+            static_prefix=self.get_static_prompt()
+        ))
+
+    async def agenerate_dialogue(self, user_input, narrative_state=None, memory_system=None):
+        """Async variant of `generate_dialogue` for concurrent party discussion."""
+        return self._dialogue_reply(await self.llm_client.aget_completion(
+            self._build_dialogue_prompt(user_input, narrative_state, memory_system),
+            system_prompt=self.get_system_prompt(),
+            static_prefix=self.get_static_prompt()
+        ))
+
+    def generate_action(self, narrative_state, memory_system=None):
+        """Generate specific action based on narrative state."""
         action_text = self.llm_client.get_completion(
-            prompt,
-            system_prompt=self.get_system_prompt()
+            self._build_action_prompt(narrative_state, memory_system),
+            system_prompt=self.get_system_prompt(),
+            static_prefix=self.get_static_prompt()
+        )
+        return f"**{self.name}:** {action_text}"
+
+    async def agenerate_action(self, narrative_state, memory_system=None):
+        """Async variant of `generate_action` for concurrent party turns."""
+        action_text = await self.llm_client.aget_completion(
+            self._build_action_prompt(narrative_state, memory_system),
+            system_prompt=self.get_system_prompt(),
+            static_prefix=self.get_static_prompt()
         )
         return f"**{self.name}:** {action_text}"
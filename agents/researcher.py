@@ -1,13 +1,13 @@
 import os
 import re
-from core.llm_client import LLMClient
+from core.llm_client import get_llm_client
 
 class Researcher:
     def __init__(self, model_name=None):
         self.provider = os.getenv("LLM_PROVIDER", "google").lower()
         self.model_name = model_name or os.getenv("LLM_MODEL", "gemini-2.0-flash")
         
-        self.client = LLMClient(provider=self.provider, model_name=self.model_name)
+        self.client = get_llm_client(provider=self.provider, model_name=self.model_name)
         
         self.system_prompt = """
         You are a Miskatonic University Researcher.
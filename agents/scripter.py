@@ -2,7 +2,7 @@ import os
 import json
 import yaml
 from duckduckgo_search import DDGS
-from core.llm_client import LLMClient
+from core.llm_client import get_llm_client
 
 class Scripter:
     def __init__(self, provider=None, model_name=None):
@@ -10,7 +10,7 @@ class Scripter:
         self.provider = provider or os.getenv("SCRIPTER_PROVIDER", "google")
         self.model_name = model_name or os.getenv("SCRIPTER_MODEL", "gemini-2.0-flash")
         
-        self.client = LLMClient(provider=self.provider, model_name=self.model_name)
+        self.client = get_llm_client(provider=self.provider, model_name=self.model_name)
         
         print(f"[SYSTEM] Scripter initialized using {self.provider}/{self.model_name}")
 
@@ -136,6 +136,9 @@ class Scripter:
                     return f"Error: Generated JSON is a list, expected dict."
             
             yaml_output = yaml.dump(data, allow_unicode=True, sort_keys=False, default_flow_style=False, width=1000)
+
+            if self.client.cache:
+                print(f"[SYSTEM] Scripter response cache: {self.client.cache.stats()}")
             return yaml_output
             
         except json.JSONDecodeError as e:
@@ -0,0 +1,94 @@
+"""
+Compares the vector-store backends behind RAGSystem on synthetic embeddings.
+Reports build time, query latency (p50/p95) and recall@k against exact search.
+
+    python bench_vector_store.py                 # 1k, 10k, 100k vectors
+    python bench_vector_store.py --sizes 1000 --queries 50
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+# Ensure we can import from the project root
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.vector_store import ChromaVectorStore, NumpyVectorStore, chromadb
+
+
+def make_dataset(size, dim, queries, seed=0):
+    """Clustered unit vectors (like sentence embeddings), plus noisy queries near them."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(8, size // 100), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size)
+    data = centers[labels] + 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    picks = rng.integers(0, size, queries)
+    query_vecs = data[picks] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32)
+    query_vecs /= np.linalg.norm(query_vecs, axis=1, keepdims=True)
+    return data, query_vecs
+
+
+def exact_top_k(data, query_vecs, k):
+    scores = query_vecs @ data.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def run_backend(store, data, query_vecs, truth, k):
+    ids = [str(i) for i in range(len(data))]
+    start = time.perf_counter()
+    for offset in range(0, len(data), store.max_batch_size):
+        end = offset + store.max_batch_size
+        store.upsert(ids[offset:end], ids[offset:end], data[offset:end], [None] * len(ids[offset:end]))
+    build = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for query, expected in zip(query_vecs, truth):
+        start = time.perf_counter()
+        results = store.query(query, k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & {int(doc_id) for doc_id, _, _, _ in results})
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "build_s": build,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "recall": hits / (k * len(truth)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAG vector-store backends.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)  # all-MiniLM-L6-v2 (Chroma's default model)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    backends = {"numpy": lambda path: NumpyVectorStore(os.path.join(path, "numpy"))}
+    if chromadb is not None:
+        backends["chroma"] = lambda path: ChromaVectorStore(os.path.join(path, "chroma"), "bench")
+    else:
+        print("chromadb not installed; benchmarking the numpy backend only.")
+
+    print(f"{'size':>8} {'backend':>8} {'build s':>9} {'p50 ms':>8} {'p95 ms':>8} {'recall@' + str(args.k):>10}")
+    for size in args.sizes:
+        data, query_vecs = make_dataset(size, args.dim, args.queries)
+        truth = exact_top_k(data, query_vecs, args.k)
+        for name, factory in backends.items():
+            workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+            try:
+                stats = run_backend(factory(workdir), data, query_vecs, truth, args.k)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            print(f"{size:>8} {name:>8} {stats['build_s']:>9.2f} {stats['p50_ms']:>8.2f} "
+                  f"{stats['p95_ms']:>8.2f} {stats['recall']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import re
+from collections import deque
+
+# CJK ideographs, kana, hangul and full-width forms: roughly one token per character
+CJK_RE = re.compile(r'[　-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]')
+
+
+def estimate_tokens(text):
+    """
+    Fast local token estimate (no tokenizer download).
+    ~4 characters per token for Latin text, ~1 token per CJK character.
+    """
+    if not text:
+        return 0
+    cjk = len(CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _first_sentence(text, max_chars=200):
+    """Cheap extractive compression used when a turn is folded into the summary."""
+    text = " ".join(text.split())
+    match = re.search(r'(.+?[.!?。！？])(\s|$)', text)
+    sentence = match.group(1) if match else text
+    if len(sentence) > max_chars:
+        sentence = sentence[:max_chars].rstrip() + "..."
+    return sentence
+
+
+class ContextBuilder:
+    """
+    Builds a bounded conversation context for the Keeper.
+    Recent turns are kept verbatim while they fit in `token_budget`; the oldest turns
+    are evicted first and folded into a rolling summary capped at `summary_budget`.
+    The summary can also be replaced wholesale (e.g. by an LLM summarizer) via `set_summary`.
+    """
+    def __init__(self, token_budget=3000, summary_budget=600):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.turns = deque()  # (speaker, text, tokens)
+        self.turn_tokens = 0
+        self.summary_lines = deque()  # (line, tokens)
+        self.summary_tokens = 0
+
+    def add_turn(self, speaker, text):
+        """Records a turn and evicts the oldest turns into the summary if over budget."""
+        if not text:
+            return
+        tokens = estimate_tokens(text) + 2
+        self.turns.append((speaker, text, tokens))
+        self.turn_tokens += tokens
+
+        # Always keep the newest turn, even if it alone exceeds the budget
+        while self.turn_tokens > self.token_budget and len(self.turns) > 1:
+            old_speaker, old_text, old_tokens = self.turns.popleft()
+            self.turn_tokens -= old_tokens
+            self._fold_into_summary(f"{old_speaker}: {_first_sentence(old_text)}")
+
+    def _fold_into_summary(self, line):
+        tokens = estimate_tokens(line) + 1
+        self.summary_lines.append((line, tokens))
+        self.summary_tokens += tokens
+        while self.summary_tokens > self.summary_budget and len(self.summary_lines) > 1:
+            _, old_tokens = self.summary_lines.popleft()
+            self.summary_tokens -= old_tokens
+
+    def set_summary(self, summary):
+        """Replaces the rolling summary (truncated to the summary budget, newest text kept)."""
+        self.summary_lines.clear()
+        self.summary_tokens = 0
+        if summary:
+            for line in summary.splitlines():
+                if line.strip():
+                    self._fold_into_summary(line.strip())
+
+    @property
+    def summary(self):
+        return "\n".join(line for line, _ in self.summary_lines)
+
+    def clear(self):
+        self.turns.clear()
+        self.turn_tokens = 0
+        self.summary_lines.clear()
+        self.summary_tokens = 0
+
+    def build(self, user_input):
+        """Returns the prompt: rolling summary + recent turns + the new input."""
+        if not self.turns and not self.summary_lines:
+            return user_input
+
+        sections = []
+        if self.summary_lines:
+            sections.append(f"=== STORY SO FAR (SUMMARY) ===\n{self.summary}")
+        if self.turns:
+            recent = "\n\n".join(f"{speaker}: {text}" for speaker, text, _ in self.turns)
+            sections.append(f"=== RECENT TURNS ===\n{recent}")
+        sections.append(f"=== CURRENT INPUT ===\n{user_input}")
+        return "\n\n".join(sections)
+
+    def estimated_tokens(self):
+        return self.turn_tokens + self.summary_tokens
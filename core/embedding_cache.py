@@ -0,0 +1,138 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Two-level LRU cache of text embeddings keyed by a hash of (model, text).
+    Level 1 is an in-process OrderedDict (microsecond lookups); level 2 is a SQLite
+    file (e.g. next to `data/chroma_db`) so embeddings survive restarts.
+    Vectors are stored as raw float32 bytes.
+    """
+    def __init__(self, path, model_name="default", max_entries=50000, memory_entries=2048):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_accessed ON embeddings (accessed)")
+        self._conn.commit()
+
+    def key(self, text):
+        return hashlib.sha1(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts):
+        """Returns a list aligned with `texts`: cached vector or None."""
+        keys = [self.key(text) for text in texts]
+        found = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing:
+                # Chunked to stay under SQLite's bound-parameter limit on large RAG batches
+                missing_keys, rows = list(missing), []
+                for start in range(0, len(missing_keys), 500):
+                    chunk = missing_keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows.extend(self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ).fetchall())
+                now = time.time()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    for i in missing[key]:
+                        found[i] = vector
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET accessed = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+                    self._conn.commit()
+
+            hits = sum(1 for vector in found if vector is not None)
+            self.hits += hits
+            self.misses += len(texts) - hits
+        return found
+
+    def put_many(self, texts, vectors):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes(), now))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, accessed) VALUES (?, ?, ?)", rows
+            )
+            self._writes_since_evict += len(rows)
+            # Evicting on every write would cost a COUNT(*) per insert; do it in batches
+            if self._writes_since_evict >= 256:
+                self._evict()
+                self._writes_since_evict = 0
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY accessed ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": (self.hits / lookups) if lookups else 0.0}
+
+
+class CachedEmbedder:
+    """Embeds texts through an EmbeddingCache, calling the model once for all misses."""
+    def __init__(self, embedding_fn, cache):
+        self.embedding_fn = embedding_fn
+        self.cache = cache
+
+    def __call__(self, texts):
+        vectors = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Embed each distinct missing text once
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(unique, (np.asarray(v, dtype=np.float32) for v in self.embedding_fn(unique))))
+            self.cache.put_many(unique, [computed[text] for text in unique])
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+        return vectors
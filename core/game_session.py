@@ -0,0 +1,412 @@
+import os
+import copy
+import time
+from collections import deque
+
+from agents.player_agent import PlayerAgent
+from core.keeper import Keeper, parse_roll_request
+from core.llm_client import is_system_error
+from core.memory_system import MemorySystem
+from core.rng import RNGService
+from core.turn_jobs import Speculation
+
+# Messages loaded from a save for display and Keeper context; older ones stay in the store
+SAVE_LOAD_MESSAGES = int(os.getenv("SAVE_LOAD_MESSAGES", "200"))
+
+# Phases: what the next step has to be
+PLAYER, ROLL, AGENT = "player", "roll", "agent"
+
+
+class GameSession:
+    """
+    One playthrough of a campaign without any UI: the Keeper, the turn queue, the
+    [ROLL_REQUIRED] / negotiation cycle, companion turns, rolls and saving. Both the
+    Streamlit app and headless runners drive it through its step methods, each of which
+    plays one turn, saves, and returns a result dict:
+      kind          player_action, discuss, end_turn, roll, negotiate or agent_turn
+      messages      messages added by the step
+      pending_roll  whether the Keeper now demands a roll
+      error         API failure text, else None; a failed step leaves the state as it was,
+                    so it can simply be retried
+      halt          the turns queued after this one should not run (roll or error)
+      seconds       wall time of the step
+    Steps must run one at a time; `on_chunk(text_so_far)` receives streamed Keeper text.
+    """
+    def __init__(self, campaign_file, store=None, hero=None, enable_researcher=False, memory_dir=None,
+                 write_behind=True, seed=None, load_messages=None):
+        self.campaign_file = campaign_file
+        self.campaign_name = os.path.splitext(os.path.basename(campaign_file))[0]
+        self.store = store  # core.session_store.Session or core.state_manager.SaveStore; None = never saved
+        self.hero = hero or {}
+        self.game_state = {}
+        self.messages = []
+        self.history_offset = 0  # Absolute index of messages[0] in the saved history
+        self.turn_queue = []
+        self.pending_roll = False
+        self.speculation = {}  # agent name -> Speculation of their next action
+        self.loaded = False
+
+        if store is not None and store.exists():
+            try:
+                self.game_state = store.load() or {}
+                # Only the most recent messages are read; earlier ones stay in the store
+                self.messages = store.tail_messages(SAVE_LOAD_MESSAGES if load_messages is None else load_messages)
+                self.history_offset = store.history_len - len(self.messages)
+                self.turn_queue = list(self.game_state.get('turn_queue', []))
+                self.pending_roll = self.game_state.get('pending_roll', False)
+                self.loaded = True
+            except Exception as e:
+                print(f"[SESSION] Could not load save for {self.campaign_name}: {e}")
+                self.game_state, self.messages, self.history_offset = {}, [], 0
+        elif store is not None:
+            store.load()
+
+        saved_rng = self.game_state.get('rng')
+        self.rng = RNGService.from_state(saved_rng) if saved_rng else RNGService(seed)
+
+        memory = None
+        if store is not None and hasattr(store, 'memory_backend'):
+            memory = MemorySystem(save_dir=memory_dir or "data/saves", write_behind=write_behind)
+            memory.load_memory(self.campaign_name, backend=store.memory_backend())
+        elif memory_dir is not None:
+            memory = MemorySystem(save_dir=memory_dir, write_behind=write_behind)
+            memory.load_memory(self.campaign_name)
+
+        self.keeper = Keeper(campaign_file, enable_researcher=enable_researcher, memory_system=memory)
+        self.keeper.restore_history(self.messages)
+        self.keeper.restore_scene_state(self.game_state.get('scene'))
+        saved_agents = self.game_state.get('agents', {})
+        for agent in self.keeper.ai_party:
+            if agent.name in saved_agents:
+                agent.inventory = saved_agents[agent.name].get('inventory', [])
+                if 'stats' in saved_agents[agent.name]:
+                    agent.stats = saved_agents[agent.name]['stats']
+
+    @property
+    def phase(self):
+        if self.pending_roll:
+            return ROLL
+        return AGENT if self.turn_queue else PLAYER
+
+    # --- SAVING ---
+
+    def update_game_state(self):
+        """Refreshes `game_state` with agent states, RNG, scene, turn queue and roll state."""
+        self.game_state.pop('history', None)  # Messages go to the store's history log
+        self.game_state['agents'] = {
+            agent.name: {'inventory': getattr(agent, 'inventory', []), 'stats': agent.stats}
+            for agent in self.keeper.ai_party
+        }
+        self.game_state['scene'] = self.keeper.get_scene_state()
+        self.game_state['rng'] = self.rng.get_state()
+        self.game_state['turn_queue'] = list(self.turn_queue)
+        self.game_state['pending_roll'] = bool(self.pending_roll)
+        return self.game_state
+
+    def save(self):
+        """Saves the state; only messages added since the last save are appended."""
+        self.update_game_state()
+        if self.store is not None:
+            self.store.save(self.game_state, self.messages, offset=self.history_offset)
+
+    def load_earlier(self, count):
+        """Prepends up to `count` older messages from the store; returns how many were read."""
+        if self.store is None or self.history_offset <= 0 or count <= 0:
+            return 0
+        start = max(0, self.history_offset - count)
+        earlier = self.store.read_messages(start, self.history_offset)
+        self.messages[:0] = earlier
+        self.history_offset = start
+        return len(earlier)
+
+    # --- STEPS ---
+
+    def _result(self, kind, started, first_message, error=None, **extra):
+        result = {
+            'kind': kind,
+            'messages': self.messages[first_message:],
+            'pending_roll': self.pending_roll,
+            'error': error,
+            'halt': bool(error) or self.pending_roll,
+            'seconds': time.perf_counter() - started,
+        }
+        result.update(extra)
+        return result
+
+    def _narrate(self, prompt, on_chunk=None, staged=()):
+        """
+        Runs a Keeper turn. On success the `staged` messages (what led to it) and the reply
+        are appended and the text is returned; if the API failed nothing is appended and
+        None is returned (see `keeper.last_error`).
+        """
+        text = ""
+        for chunk in self.keeper.generate_narrative_stream(prompt):
+            text += chunk
+            if on_chunk:
+                on_chunk(text)
+        if self.keeper.last_error:
+            return None
+        self.messages.extend(staged)
+        self.messages.append({'role': 'assistant', 'content': text, 'avatar': '🐙'})
+        return text
+
+    def player_action(self, text, then_party=False, on_chunk=None):
+        """
+        The protagonist acts and the Keeper resolves it; the reply may demand a roll.
+        With `then_party`, the companions are queued to act next unless a roll is needed.
+        """
+        started, first = time.perf_counter(), len(self.messages)
+        if self._narrate(text, on_chunk, staged=[{'role': 'user', 'content': text}]) is None:
+            return self._result('player_action', started, first, self.keeper.last_error)
+        self.pending_roll = self.keeper.last_roll_required
+        if then_party and not self.pending_roll:
+            self.turn_queue[:] = [agent.name for agent in self.keeper.ai_party]
+        self.save()
+        return self._result('player_action', started, first)
+
+    def discuss(self, text, on_chunk=None):
+        """All companions answer concurrently; messages keep party order. Nothing is kept if a reply failed."""
+        started, first = time.perf_counter(), len(self.messages)
+        self.messages.append({'role': 'user', 'content': text})
+        for agent, response in self.keeper.get_party_dialogue(text):
+            if response is None:
+                del self.messages[first:]
+                return self._result('discuss', started, first, agent.last_error, agent=agent.name)
+            self.messages.append({'role': 'agent', 'content': f"**{agent.name}:** {response}"})
+        self.save()
+        return self._result('discuss', started, first)
+
+    def end_turn(self, on_chunk=None):
+        """Passes the turn to the AI party."""
+        started = time.perf_counter()
+        self.turn_queue[:] = [agent.name for agent in self.keeper.ai_party]
+        self.save()
+        return self._result('end_turn', started, len(self.messages))
+
+    def resolve_roll(self):
+        """
+        Rolls for whoever the Keeper asked (the queued companion, else the protagonist) on
+        their own RNG stream, against the target named in the Keeper's request.
+        Returns (roller, skill, target, roll, status); the roll is not logged.
+        """
+        request = next((m['content'] for m in reversed(self.messages) if m['role'] == 'assistant'), "")
+        skill, target = parse_roll_request(request)
+
+        agent = None
+        if self.turn_queue:
+            agent = next((a for a in self.keeper.ai_party if a.name == self.turn_queue[0]), None)
+        if agent:
+            roller, stats = agent.name, agent.stats
+        else:
+            roller, stats = self.hero.get('name', 'Protagonist'), self.hero.get('stats', {})
+
+        if target is None and skill:
+            skills = {k.lower(): v for k, v in (stats.get('Skills') or {}).items()}
+            target = skills.get(skill.lower())
+        target = int(target) if target is not None else 50
+        status, roll = self.rng.check(roller, target)
+        return roller, skill, target, roll, status
+
+    def roll(self, on_chunk=None):
+        """
+        Rolls the pending check and has the Keeper resolve it; this ends the queued
+        companion's turn. If the Keeper fails, the dice are rewound and the roll stays pending.
+        """
+        started, first = time.perf_counter(), len(self.messages)
+        rng_state = self.rng.get_state()
+        roller, skill, target, roll_val, result_str = self.resolve_roll()
+        skill_name = skill or "Roll"
+        roll_message = {'role': 'user', 'content': f"🎲 **{skill_name} ({target}):** {roll_val} ({result_str})"}
+
+        # The stream never shows [ROLL_REQUIRED], so a resolution does not loop into another roll
+        if self._narrate(f"Result: {roll_val} vs {target} ({result_str}). Resolve the scene.", on_chunk,
+                         staged=[roll_message]) is None:
+            self.rng = RNGService.from_state(rng_state)
+            return self._result('roll', started, first, self.keeper.last_error)
+        if hasattr(self.store, 'log_roll'):
+            self.store.log_roll(roller, roll_val, skill=skill, target=target, result=result_str,
+                                turn=self.history_offset + first)
+        self.pending_roll = False
+        if self.turn_queue:
+            self.turn_queue.pop(0)
+        self.save()
+        return self._result('roll', started, first, roll=(skill_name, target, roll_val, result_str))
+
+    def negotiate(self, text, on_chunk=None):
+        """Asks the Keeper to reconsider the pending check; the reply decides whether a roll is still needed."""
+        started, first = time.perf_counter(), len(self.messages)
+        negotiation = {'role': 'user', 'content': f"(Negotiating) {text}"}
+        if self._narrate(f"Player asks: '{text}'. Re-evaluate the skill check.", on_chunk, staged=[negotiation]) is None:
+            return self._result('negotiate', started, first, self.keeper.last_error)
+        self.pending_roll = self.keeper.last_roll_required
+        self.save()
+        return self._result('negotiate', started, first)
+
+    def _speculate_next_action(self):
+        """
+        Starts drafting the action of the companion after the current one, from the story as
+        it stands now. It is used as-is unless the current resolution moves the party to
+        another scene.
+        """
+        if len(self.turn_queue) < 2 or self.turn_queue[1] in self.speculation:
+            return
+        agent_obj = next((a for a in self.keeper.ai_party if a.name == self.turn_queue[1]), None)
+        if agent_obj:
+            # Snapshot the last event: the Keeper appends to narrative_state while this runs
+            self.speculation[agent_obj.name] = Speculation(
+                self.keeper.current_scene, agent_obj.generate_action,
+                list(self.keeper.narrative_state)[-1:], self.keeper.memory_system
+            )
+
+    def discard_speculation(self):
+        for draft in self.speculation.values():
+            draft.discard()
+        self.speculation.clear()
+
+    def agent_turn(self, agent_name=None, speculate=False, on_chunk=None):
+        """
+        The companion at the head of the queue acts and the Keeper resolves it; a demanded
+        roll keeps them at the head of the queue. `agent_name` skips the step if the queue
+        has moved on since it was scheduled. With `speculate`, the next companion's action
+        is drafted while the Keeper is resolving this one.
+        """
+        started, first = time.perf_counter(), len(self.messages)
+        agent_name = agent_name or (self.turn_queue[0] if self.turn_queue else None)
+        speculation = self.speculation.pop(agent_name, None)
+        if not self.turn_queue or self.turn_queue[0] != agent_name:
+            if speculation:
+                speculation.discard()
+            return self._result('agent_turn', started, first, agent=agent_name, skipped=True)
+
+        agent_obj = next((a for a in self.keeper.ai_party if a.name == agent_name), None)
+        if agent_obj is None:
+            self.turn_queue.pop(0)
+            return self._result('agent_turn', started, first, agent=agent_name, skipped=True)
+
+        action_intent = speculation.result(self.keeper.current_scene) if speculation else None
+        if action_intent is not None and is_system_error(action_intent.split(":** ", 1)[-1]):
+            action_intent, speculation.discard_reason = None, "failed"  # The API error came back as text
+        if speculation and action_intent is None:
+            print(f"[TURNS] Drafted action for {agent_name} discarded ({speculation.discard_reason}); regenerating")
+        if action_intent is None:
+            action_intent = agent_obj.generate_action(self.keeper.narrative_state, self.keeper.memory_system)
+        action_error = action_intent.split(":** ", 1)[-1]
+        if is_system_error(action_error):
+            self.discard_speculation()
+            return self._result('agent_turn', started, first, action_error, agent=agent_name)
+
+        if speculate:
+            self._speculate_next_action()
+        action_message = {'role': 'agent', 'content': action_intent, 'avatar': '🗣️'}
+        if self._narrate(f"Resolution: {action_intent}", on_chunk, staged=[action_message]) is None:
+            self.discard_speculation()
+            return self._result('agent_turn', started, first, self.keeper.last_error, agent=agent_name)
+
+        self.pending_roll = self.keeper.last_roll_required
+        if self.pending_roll:
+            # The roll's outcome is new story the drafts did not see; the chain stops here anyway
+            self.discard_speculation()
+        else:
+            self.turn_queue.pop(0)  # On a roll, the agent's turn ends when the roll is resolved
+        self.save()
+        return self._result('agent_turn', started, first, agent=agent_name)
+
+    def step(self, protagonist, speculate=False, on_chunk=None):
+        """
+        Plays whatever the state calls for next: the pending roll (or the protagonist's
+        negotiation), the next queued companion, or the protagonist's move. Returns the
+        step result, or None once the protagonist has no more moves.
+        """
+        if self.pending_roll:
+            text = protagonist.negotiate(self)
+            return self.negotiate(text, on_chunk=on_chunk) if text else self.roll(on_chunk=on_chunk)
+        if self.turn_queue:
+            return self.agent_turn(speculate=speculate, on_chunk=on_chunk)
+
+        move = protagonist.next_move(self)
+        if move is None:
+            return None
+        kind, text = move
+        if kind == "action":
+            return self.player_action(text, on_chunk=on_chunk)
+        if kind == "discuss":
+            return self.discuss(text)
+        if kind == "end_turn":
+            return self.end_turn()
+        raise ValueError(f"Unknown protagonist move '{kind}'")
+
+    def close(self):
+        """Waits for background work (drafts, summaries, memory writes) to finish and stops the memory writer."""
+        self.discard_speculation()
+        if self.keeper.summary_worker:
+            self.keeper.summary_worker.wait()
+        if self.keeper.memory_system and hasattr(self.keeper.memory_system, 'close'):
+            self.keeper.memory_system.close()
+
+
+# --- PROTAGONISTS (headless players) ---
+
+class ScriptedProtagonist:
+    """
+    Plays a fixed list of moves. A plain string is an action; a dict or pair names the
+    kind: {'action': ...}, {'discuss': ...}, {'negotiate': ...} or 'end_turn'. A
+    negotiate move answers the next roll demand (otherwise the roll is made); one that
+    comes up when no roll is pending is skipped.
+    """
+    def __init__(self, moves):
+        self.moves = deque(self._normalize(move) for move in moves)
+
+    @staticmethod
+    def _normalize(move):
+        if isinstance(move, dict):
+            (kind, text), = move.items()
+            return kind, text
+        if isinstance(move, (list, tuple)):
+            return move[0], (move[1] if len(move) > 1 else None)
+        if move == "end_turn":
+            return "end_turn", None
+        return "action", str(move)
+
+    def next_move(self, session):
+        while self.moves and self.moves[0][0] == "negotiate":
+            self.moves.popleft()
+        return self.moves.popleft() if self.moves else None
+
+    def negotiate(self, session):
+        if self.moves and self.moves[0][0] == "negotiate":
+            return self.moves.popleft()[1]
+        return None
+
+
+class BotProtagonist:
+    """
+    LLM-driven protagonist: a PlayerAgent built from the hero sheet decides each action
+    from the latest narration, then passes the turn to the party. Stops after
+    `max_actions` actions; never negotiates.
+    """
+    def __init__(self, hero, max_actions=10, pass_to_party=True, model_name=None):
+        hero = hero or {}
+        self.agent = PlayerAgent(
+            name=hero.get('name', 'Protagonist'),
+            stats=copy.deepcopy(hero.get('stats', {})),
+            personality=hero.get('personality', hero.get('occupation', 'Investigator')),
+            gender=hero.get('gender', 'Unknown'),
+            model_name=model_name,
+        )
+        self.remaining = max_actions
+        self.pass_to_party = pass_to_party
+        self._pass_next = False
+
+    def next_move(self, session):
+        if self._pass_next:
+            self._pass_next = False
+            return "end_turn", None
+        if self.remaining <= 0:
+            return None
+        self.remaining -= 1
+        self._pass_next = self.pass_to_party and bool(session.keeper.ai_party)
+        action = self.agent.generate_action(session.keeper.narrative_state, session.keeper.memory_system)
+        return "action", action.split(":** ", 1)[-1]
+
+    def negotiate(self, session):
+        return None
@@ -1,52 +1,118 @@
 import os
-import yaml
+import copy
+import re
 import json
+import asyncio
+from collections import deque
 from core.rules import d100_roll, check_success, sanity_check
 from agents.player_agent import PlayerAgent
 from agents.researcher import Researcher
-from core.llm_client import LLMClient
+from core.llm_client import get_llm_client, run_coroutine, is_system_error
+from core.context_builder import ContextBuilder
+from core.summarizer import SummaryWorker
+from core.scenario_loader import load_campaign_index
+
+ROLL_TAG = "[ROLL_REQUIRED]"
+# Scene-tracking markers the Keeper appends when the party moves on or finds a clue
+STATE_TAG_RE = re.compile(r"\[(SCENE|CLUE):\s*([^\]\n]*?)\s*\]")
+STATE_TAG_PREFIXES = ("[SCENE:", "[CLUE:")
+# "Please roll for Spot Hidden (Target: 45)" / "目標：45"
+ROLL_SKILL_RE = re.compile(r"roll (?:for )?\**([^()\[\]\n*]+?)\**\s*[(（]", re.IGNORECASE)
+ROLL_TARGET_RE = re.compile(r"(?:Target|目標值?)\s*[:：]?\s*(\d{1,3})", re.IGNORECASE)
+
+# Narrations kept in memory for agents (ring buffer) and prompt budget for history
+NARRATIVE_STATE_LIMIT = int(os.getenv("NARRATIVE_STATE_LIMIT", "50"))
+KEEPER_CONTEXT_TOKENS = int(os.getenv("KEEPER_CONTEXT_TOKENS", "3000"))
+KEEPER_SUMMARY_TOKENS = int(os.getenv("KEEPER_SUMMARY_TOKENS", "600"))
+
+
+def _partial_tag_suffix(text, tag=ROLL_TAG):
+    """Length of the longest suffix of `text` that could be the start of `tag`."""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
+
+
+# Static prompts are pure functions of their key, so every Keeper in the process shares them
+_STATIC_PROMPTS = {}
+
+
+def parse_roll_request(text):
+    """Skill name and target number from a Keeper roll request; either may be None."""
+    skill = ROLL_SKILL_RE.search(text or "")
+    target = ROLL_TARGET_RE.search(text or "")
+    return (skill.group(1).strip() if skill else None,
+            int(target.group(1)) if target else None)
+
+
+def _strip_tags(text):
+    """Removes [ROLL_REQUIRED], [SCENE: ...] and [CLUE: ...] markers from narration."""
+    return STATE_TAG_RE.sub("", text.replace(ROLL_TAG, ""))
+
+
+def _held_back_suffix(text):
+    """Length of the tail of streamed text that may still turn into a marker."""
+    for prefix in STATE_TAG_PREFIXES:
+        start = text.rfind(prefix)
+        if start != -1 and "]" not in text[start:] and "\n" not in text[start:]:
+            return len(text) - start
+    return max(_partial_tag_suffix(text, tag) for tag in (ROLL_TAG,) + STATE_TAG_PREFIXES)
+
 
 class Keeper:
-    def __init__(self, campaign_file, model_name=None, enable_researcher=False):
+    def __init__(self, campaign_file, model_name=None, enable_researcher=False, party_concurrency=None, memory_system=None):
         self.campaign_data = self.load_campaign(campaign_file)
         
         # Determine Provider/Model
         self.provider = os.getenv("LLM_PROVIDER", "google").lower()
         self.model_name = model_name or os.getenv("LLM_MODEL", "gemini-2.0-flash")
         
-        self.client = LLMClient(provider=self.provider, model_name=self.model_name)
+        self.client = get_llm_client(provider=self.provider, model_name=self.model_name)
         self.enable_researcher = enable_researcher
         self.researcher = Researcher(model_name=self.model_name) if enable_researcher else None 
 
+        # Shared memory, summarized in the background so turns never wait on it
+        self.memory_system = memory_system
+        self.summary_worker = SummaryWorker(memory_system, self.client, on_summary=self._on_memory_summary) if memory_system else None
+        self._pending_summary = None  # Latest memory summary, applied to the context before the next prompt
+
+        # Max number of party members talking to the LLM at the same time
+        self.party_concurrency = max(1, int(party_concurrency or os.getenv("PARTY_CONCURRENCY", "4")))
+
         # Load AI party
         self.ai_party = []
         for agent_data in self.campaign_data.get('ai_party', []):
             self.ai_party.append(PlayerAgent(
                 name=agent_data['name'], 
-                stats=agent_data.get('stats', {}), 
+                stats=copy.deepcopy(agent_data.get('stats', {})),  # The campaign index is shared process-wide 
                 personality=agent_data.get('personality', ''),
                 gender=agent_data.get('gender', 'Unknown'), # Pass gender
                 model_name=self.model_name
             ))
             
-        self.narrative_state = []
+        self.narrative_state = deque(maxlen=NARRATIVE_STATE_LIMIT)
+        self.context = ContextBuilder(token_budget=KEEPER_CONTEXT_TOKENS, summary_budget=KEEPER_SUMMARY_TOKENS)
+        self.last_roll_required = False  # Set by generate_narrative_stream once the stream ends
+        self.last_error = None  # API failure text from the last narration, kept out of the story
+        self._dynamic_prompt = None  # (inputs, prompt) memo for get_dynamic_prompt
+
+        # Scene tracking: only the current scene's slice of the scenario is sent per turn
+        self.current_scene = self.campaign_index.start_scene
+        self.discovered_clues = set()  # "scene_id#index"
         print(f"[SYSTEM] Keeper initialized on {self.provider}/{self.model_name}")
 
     def load_campaign(self, campaign_file):
-        with open(campaign_file, 'r', encoding='utf-8') as f:
-            campaign_data = yaml.safe_load(f)
-        return campaign_data
+        """Loads the compiled campaign index (cached sidecar) and returns the raw campaign dict."""
+        self.campaign_index = load_campaign_index(campaign_file)
+        return self.campaign_index.data
 
-    def get_system_prompt(self):
+    def _build_static_prompt(self):
         """Generates the Keeper's English instructions based on complexity."""
         
-        base_prompt = f"""
+        base_prompt = """
         You are the KEEPER OF ARCANE LORE (Game Master) for a Call of Cthulhu 7th Edition scenario.
         
-        === CAMPAIGN CONTEXT ===
-        Title: {self.campaign_data.get('title', 'Unknown Scenario')}
-        Introduction: {self.campaign_data.get('introduction', '')}
-        
         === LANGUAGE GUIDELINES (STRICT) ===
         1. **Detect Language:** Follow the user's input language strictly.
            - **English Input** -> Respond in **English**.
@@ -60,7 +126,7 @@ class Keeper:
         """
 
         if self.provider in ["google", "openrouter"]:
-            return base_prompt + """
+            rules_prompt = base_prompt + """
             === YOUR RESPONSIBILITIES (COMPLEX MODE) ===
             1. ATMOSPHERE & FREEDOM: 
                - Describe scenes with visceral, sensory details (smell, sound, touch). 
@@ -89,7 +155,7 @@ class Keeper:
             - Be fair but unforgiving. The cosmos does not care about the investigators.
             """
         else:
-             return base_prompt + """
+            rules_prompt = base_prompt + """
             === YOUR RESPONSIBILITIES (SIMPLE MODE) ===
             - Describe the scene clearly.
             - Ask the player what they want to do.
@@ -97,23 +163,250 @@ class Keeper:
             - Do not play the user's character.
             """
 
+        # Campaign context goes last so the rules above stay a shared prefix across campaigns
+        if not len(self.campaign_index):
+            # No scene graph to track: fall back to the whole introduction
+            return rules_prompt + f"""
+        === CAMPAIGN CONTEXT ===
+        Title: {self.campaign_index.title}
+        Introduction: {self.campaign_index.introduction}
+        """
+
+        return rules_prompt + f"""
+        === CAMPAIGN CONTEXT ===
+        Title: {self.campaign_index.title}
+        Only the CURRENT SCENE of the script is shown below; follow it closely.
+
+        === SCENE TRACKING ===
+        - When the investigators move to one of the listed EXITS, end your reply with `[SCENE: scene_id]`.
+        - When they uncover one of the listed UNDISCOVERED CLUES, end your reply with `[CLUE: number]`.
+        - These markers are hidden from the players. Never invent scene ids or clue numbers.
+        """
+
+    def get_static_prompt(self):
+        """
+        Stable prefix of the system prompt (rules, language guide, campaign context).
+        Built once per (provider, campaign context) and shared by every Keeper in the process.
+        """
+        key = (self.provider, self.campaign_index.title, self.campaign_index.introduction, len(self.campaign_index) > 0)
+        prompt = _STATIC_PROMPTS.get(key)
+        if prompt is None:
+            prompt = _STATIC_PROMPTS[key] = self._build_static_prompt()
+        return prompt
+
+    def _build_scene_prompt(self):
+        """Renders the current scene: description, exits, undiscovered clues, items, SAN events, NPCs."""
+        index = self.campaign_index
+        scene_id = self.current_scene
+        scene = index.scene(scene_id)
+        lines = ["", "=== CURRENT SCENE ===", f"Scene: {scene['name']} (id: {scene_id})"]
+        if scene_id == index.start_scene and index.introduction:
+            lines.append(f"Introduction: {str(index.introduction).strip()}")
+        lines.append(f"Description: {str(scene['description']).strip()}")
+
+        clues = [(n, clue) for n, clue in enumerate(index.clues[scene_id], 1)
+                 if f"{scene_id}#{n - 1}" not in self.discovered_clues]
+        if clues:
+            lines.append("UNDISCOVERED CLUES:")
+            for n, clue in clues:
+                check = f" [{clue['skill_check']}]" if clue['skill_check'] else ""
+                lines.append(f"  {n}. {clue['description']}{check}")
+                if clue['success_outcome']:
+                    lines.append(f"     Success: {clue['success_outcome']}")
+                if clue['failure_outcome']:
+                    lines.append(f"     Failure: {clue['failure_outcome']}")
+
+        if index.items[scene_id]:
+            lines.append("ITEMS:")
+            for item in index.items[scene_id]:
+                effect = f" (Effect: {item['effect']})" if item['effect'] else ""
+                lines.append(f"  - {item['name']}: {item['description']}{effect}")
+
+        if index.sanity_events[scene_id]:
+            lines.append("SANITY EVENTS:")
+            for event in index.sanity_events[scene_id]:
+                lines.append(f"  - {event.get('trigger', '')} (SAN loss {event.get('loss', '?')})")
+
+        if index.scene_npcs[scene_id]:
+            lines.append("NPCS PRESENT:")
+            for name in index.scene_npcs[scene_id]:
+                npc = index.npcs.get(name, {})
+                about = npc.get('description') or npc.get('personality') or npc.get('role') or ""
+                lines.append(f"  - {name}: {about}" if about else f"  - {name}")
+
+        exits = index.next_scenes[scene_id]
+        lines.append("EXITS:" if exits else "EXITS: none (final scene)")
+        for edge in exits:
+            target = index.scene(edge['target'])
+            condition = f" - when: {edge['condition']}" if edge['condition'] else ""
+            lines.append(f"  - {edge['target']}: {target['name']}{condition}")
+        return "\n".join(lines) + "\n"
+
+    def get_dynamic_prompt(self):
+        """
+        Per-turn part of the system prompt, appended after the stable prefix: the current
+        scene slice. Memoized per (scene, discovered clues) so its size does not grow
+        with the scenario.
+        """
+        if self.current_scene is None:
+            return ""
+        key = (self.current_scene, frozenset(c for c in self.discovered_clues if c.startswith(f"{self.current_scene}#")))
+        if self._dynamic_prompt is None or self._dynamic_prompt[0] != key:
+            self._dynamic_prompt = (key, self._build_scene_prompt())
+        return self._dynamic_prompt[1]
+
+    def _apply_state_tags(self, narrative_text):
+        """Moves to the scene / marks clues named by [SCENE: id] and [CLUE: n] markers."""
+        index = self.campaign_index
+        for kind, value in STATE_TAG_RE.findall(narrative_text):
+            if kind == "CLUE" and self.current_scene is not None:
+                try:
+                    number = int(value.lstrip("#"))
+                except ValueError:
+                    continue
+                clues = index.clues[self.current_scene]
+                key = f"{self.current_scene}#{number - 1}"
+                if 1 <= number <= len(clues) and key not in self.discovered_clues:
+                    self.discovered_clues.add(key)
+                    if self.memory_system:
+                        self.memory_system.update_global_context(new_clues=[clues[number - 1]['description']])
+            elif kind == "SCENE" and value in index and value != self.current_scene:
+                self.current_scene = value
+                if self.memory_system:
+                    self.memory_system.update_global_context(location=index.scene(value)['name'])
+
+    def get_scene_state(self):
+        """Serializable scene-tracking state for save files."""
+        return {"current": self.current_scene, "discovered_clues": sorted(self.discovered_clues)}
+
+    def restore_scene_state(self, state):
+        """Restores `get_scene_state()` output; unknown scene ids fall back to the start scene."""
+        state = state or {}
+        scene_id = state.get("current")
+        self.current_scene = scene_id if scene_id in self.campaign_index else self.campaign_index.start_scene
+        self.discovered_clues = set(state.get("discovered_clues", []))
+
+    def get_system_prompt(self):
+        """Full system prompt: memoized stable prefix followed by the per-turn part."""
+        return self.get_static_prompt() + self.get_dynamic_prompt()
+
+    def restore_history(self, messages):
+        """Rebuilds narrative_state and the prompt context from saved chat messages."""
+        self.narrative_state.clear()
+        self.context.clear()
+        for message in messages:
+            if message['role'] == 'assistant':
+                self.narrative_state.append({'description': message['content']})
+                self.context.add_turn("KEEPER", message['content'])
+            else:
+                self.context.add_turn("PLAYER", message['content'])
+        if self.memory_system:
+            self._on_memory_summary(self.memory_system.get_story_summary())
+
+    def _on_memory_summary(self, summary):
+        """SummaryWorker callback (worker thread): the context is only touched by `_build_prompt`."""
+        if summary:
+            self._pending_summary = summary
+
+    def _build_prompt(self, user_input):
+        """Context prompt for a turn, with the latest memory summary as the story so far."""
+        summary, self._pending_summary = self._pending_summary, None
+        if summary:
+            self.context.set_summary(summary)
+        return self.context.build(user_input)
+
     def generate_narrative(self, user_input):
-        # Construct the prompt with history if needed, but for now simple input
-        prompt = user_input
+        # Recent turns + rolling summary, bounded by the context token budget
+        prompt = self._build_prompt(user_input)
         
         narrative_text = self.client.get_completion(
             prompt, 
-            system_prompt=self.get_system_prompt()
+            system_prompt=self.get_system_prompt(),
+            static_prefix=self.get_static_prompt()
         )
 
         if self.enable_researcher and self.researcher:
             pass 
 
-        self.narrative_state.append({'description': narrative_text})
-        return narrative_text
+        self._record_narrative(user_input, narrative_text)
+        return STATE_TAG_RE.sub("", narrative_text)
+
+    def _record_narrative(self, user_input, narrative_text):
+        """Adds a turn to the story state; API failures are kept in `last_error` instead."""
+        if is_system_error(narrative_text):
+            self.last_error = narrative_text
+            return
+        self.last_error = None
+        self._apply_state_tags(narrative_text)
+        self.narrative_state.append({'description': STATE_TAG_RE.sub("", narrative_text)})
+        self.context.add_turn("PLAYER", user_input)
+        self.context.add_turn("KEEPER", _strip_tags(narrative_text))
+
+        if self.memory_system:
+            self.memory_system.add_to_buffer("Player", user_input)
+            self.memory_system.add_to_buffer("Keeper", _strip_tags(narrative_text))
+            self.summary_worker.maybe_summarize()
+
+    def generate_narrative_stream(self, user_input):
+        """
+        Streams the Keeper's narration for display (e.g. via st.write_stream).
+        The [ROLL_REQUIRED], [SCENE: ...] and [CLUE: ...] markers are withheld from
+        the yielded text; check `last_roll_required` after the stream is exhausted.
+        """
+        prompt = self._build_prompt(user_input)
+        self.last_roll_required = False
+
+        narrative_text = ""
+        emitted = 0
+        for chunk in self.client.stream_completion(prompt, system_prompt=self.get_system_prompt(),
+                                                   static_prefix=self.get_static_prompt()):
+            if is_system_error(chunk):
+                # The stream broke off: drop the partial narration rather than record it
+                self._record_narrative(user_input, chunk)
+                return
+            narrative_text += chunk
+            visible = _strip_tags(narrative_text)
+            # Hold back anything that might be the beginning of a tag
+            safe_end = len(visible) - _held_back_suffix(visible)
+            if safe_end > emitted:
+                yield visible[emitted:safe_end]
+                emitted = safe_end
+
+        visible = _strip_tags(narrative_text)
+        if len(visible) > emitted:
+            yield visible[emitted:]
+
+        self.last_roll_required = ROLL_TAG in narrative_text
+        self._record_narrative(user_input, narrative_text)
+
+    async def _gather_party(self, make_call):
+        """Runs one call per party member concurrently, bounded by `party_concurrency`."""
+        semaphore = asyncio.Semaphore(self.party_concurrency)
+
+        async def run(agent):
+            async with semaphore:
+                return await make_call(agent)
+
+        return await asyncio.gather(*(run(agent) for agent in self.ai_party))
+
+    async def aget_ai_actions(self, memory_system=None):
+        """Collects every party member's action concurrently (results keep party order)."""
+        memory_system = memory_system or self.memory_system
+        return await self._gather_party(
+            lambda agent: agent.agenerate_action(self.narrative_state, memory_system)
+        )
+
+    async def aget_party_dialogue(self, user_input, memory_system=None):
+        """Collects every party member's reply to the Protagonist concurrently."""
+        memory_system = memory_system or self.memory_system
+        replies = await self._gather_party(
+            lambda agent: agent.agenerate_dialogue(user_input, self.narrative_state, memory_system)
+        )
+        return list(zip(self.ai_party, replies))
 
     def get_ai_actions(self, memory_system=None):
-        actions = []
-        for agent in self.ai_party:
-            actions.append(agent.generate_action(self.narrative_state, memory_system))
-        return actions
+        return run_coroutine(self.aget_ai_actions(memory_system))
+
+    def get_party_dialogue(self, user_input, memory_system=None):
+        """Synchronous entry point for the UI: returns [(agent, reply), ...]; a failed reply is None (see `agent.last_error`)."""
+        return run_coroutine(self.aget_party_dialogue(user_input, memory_system))
@@ -0,0 +1,98 @@
+import re
+import math
+import threading
+from collections import Counter, defaultdict
+
+from core.vector_store import match_where
+
+# Latin/digit words, or runs of CJK ideographs (split into bigrams below)
+WORD_RE = re.compile(r"[0-9a-z]+(?:['’][a-z]+)?|[㐀-䶿一-鿿豈-﫿]+")
+CJK_RUN_RE = re.compile(r"^[㐀-䶿一-鿿豈-﫿]+$")
+
+
+def tokenize(text):
+    """
+    Lowercased words for Latin text; character bigrams (plus single characters)
+    for Chinese/Cantonese, which has no spaces between words.
+    """
+    tokens = []
+    for match in WORD_RE.findall((text or "").lower()):
+        if CJK_RUN_RE.match(match):
+            tokens.extend(match)
+            tokens.extend(match[i:i + 2] for i in range(len(match) - 1))
+        else:
+            tokens.append(match)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring.
+    Postings map term -> {doc_id: term frequency}, so a query only touches
+    documents sharing at least one term with it.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)
+        self.doc_lengths = {}
+        self.documents = {}  # doc_id -> (text, metadata)
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add_many(self, ids, documents, metadatas):
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, documents, metadatas):
+                if doc_id in self.doc_lengths:
+                    self._remove(doc_id)
+                terms = Counter(tokenize(text))
+                for term, tf in terms.items():
+                    self.postings[term][doc_id] = tf
+                length = sum(terms.values())
+                self.doc_lengths[doc_id] = length
+                self.total_length += length
+                self.documents[doc_id] = (text, metadata)
+
+    def _remove(self, doc_id):
+        text, _ = self.documents.pop(doc_id)
+        for term in set(tokenize(text)):
+            self.postings[term].pop(doc_id, None)
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query, n_results, where=None):
+        """Returns up to `n_results` (id, document, metadata, score), best first."""
+        with self._lock:
+            if not self.doc_lengths:
+                return []
+            total = len(self.doc_lengths)
+            avg_length = self.total_length / total
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+            if where:
+                scores = {d: s for d, s in scores.items() if match_where(self.documents[d][1], where)}
+            best = sorted(scores.items(), key=lambda item: -item[1])[:n_results]
+            return [(doc_id, *self.documents[doc_id], score) for doc_id, score in best]
+
+
+def reciprocal_rank_fusion(result_lists, k=60):
+    """
+    Merges ranked (id, document, metadata, score) lists: each list contributes
+    1 / (k + rank) per document, so neither score scale dominates.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, (doc_id, document, metadata, _) in enumerate(results):
+            entry = fused.setdefault(doc_id, [doc_id, document, metadata, 0.0])
+            entry[3] += 1.0 / (k + rank + 1)
+    return [tuple(entry) for entry in sorted(fused.values(), key=lambda entry: -entry[3])]
@@ -1,15 +1,26 @@
 import os
 import time
 import json
+import hashlib
+import sqlite3
+import asyncio
 import logging
+import threading
+import weakref
 from dotenv import load_dotenv
 
 # Try importing OpenAI, handle if not installed (though it should be)
 try:
-    from openai import OpenAI, APIError, APIConnectionError, RateLimitError
+    from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, APIError, APIConnectionError, RateLimitError
 except ImportError:
     OpenAI = None
 
+# httpx ships with both SDKs; used to tune the shared keep-alive pool
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
 # Try importing Google GenAI
 try:
     import google.genai as genai
@@ -17,12 +28,365 @@ try:
 except ImportError:
     genai = None
 
+from core.request_scheduler import get_scheduler
+from core.context_builder import estimate_tokens
+
 load_dotenv()
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# --- CONNECTION POOL SETTINGS ---
+POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "120"))
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OLLAMA_DEFAULT_BASE_URL = "http://localhost:11434/v1"
+
+SYSTEM_ERROR_PREFIX = "[SYSTEM ERROR]"
+
+# --- PROVIDER-SIDE PROMPT CACHING ---
+# Stable system-prompt prefixes are registered with Gemini explicit context caching
+# or marked with OpenRouter `cache_control` breakpoints.
+CONTEXT_CACHE_ENABLED = os.getenv("LLM_CONTEXT_CACHE", "1").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_TTL = int(os.getenv("LLM_CONTEXT_CACHE_TTL", "3600"))
+# Seconds before retrying a prefix that could not be cached (too small, quota, outage)
+CONTEXT_CACHE_RETRY = int(os.getenv("LLM_CONTEXT_CACHE_RETRY", "600"))
+# OpenRouter model families that honour explicit cache_control breakpoints
+OPENROUTER_CACHE_CONTROL_PREFIXES = ("anthropic/", "google/")
+
+# --- RESPONSE CACHE SETTINGS (opt-in) ---
+RESPONSE_CACHE_ENABLED = os.getenv("LLM_CACHE", "0").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/cache/llm_responses.sqlite")
+RESPONSE_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "0"))  # Seconds, 0 = never expires
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "200"))
+RESPONSE_CACHE_DETERMINISTIC_ONLY = os.getenv("LLM_CACHE_DETERMINISTIC_ONLY", "1").lower() in ("1", "true", "yes")
+
+# --- PROCESS-WIDE REGISTRIES ---
+# SDK clients keyed by (provider, base_url, api_key): one connection pool per endpoint.
+# LLMClients keyed by (provider, model_name, base_url, api_key): one wrapper per model.
+_SDK_CLIENTS = {}
+_LLM_CLIENTS = {}
+_REGISTRY_LOCK = threading.RLock()
+
+# Async SDK clients are bound to the event loop that created their pool,
+# so they are registered per loop and dropped when the loop goes away.
+_ASYNC_SDK_CLIENTS = weakref.WeakKeyDictionary()
+
+# Background event loop used to drive async calls from synchronous code
+# (e.g. the Streamlit script thread) while keeping async pools warm.
+_BACKGROUND_LOOP = None
+
+_RESPONSE_CACHE = None
+
+# Gemini cached-content handles keyed by (api_key, model, prefix hash) -> (name, expires_at);
+# name is None when the prefix could not be cached (e.g. below the minimum token count)
+# until the entry expires. Creation is serialized per key, not under the registry lock.
+_CONTEXT_CACHES = {}
+_CONTEXT_CACHE_CREATE_LOCKS = {}
+_CONTEXT_CACHE_LOCK = threading.Lock()
+
+
+def _pool_limits():
+    """Keep-alive limits shared by every pooled HTTP client."""
+    if not httpx:
+        return None
+    return httpx.Limits(
+        max_connections=POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=POOL_MAX_CONNECTIONS,
+        keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def _resolve_provider(provider):
+    return (provider or os.getenv("LLM_PROVIDER", "google")).lower()
+
+
+def _resolve_endpoint(provider, api_key=None, base_url=None):
+    """Returns the (base_url, api_key) pair the provider will actually use."""
+    if provider == "google":
+        key = api_key or os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+        if not key:
+            raise ValueError("Missing GOOGLE_API_KEY for Google provider.")
+        return base_url, key
+
+    if provider == "openrouter":
+        key = api_key or os.getenv("OPENROUTER_API_KEY")
+        if not key:
+            raise ValueError("Missing OPENROUTER_API_KEY for OpenRouter provider.")
+        return base_url or OPENROUTER_BASE_URL, key
+
+    if provider == "ollama":
+        # Key is required by the SDK but ignored by Ollama
+        return base_url or os.getenv("OLLAMA_BASE_URL", OLLAMA_DEFAULT_BASE_URL), "ollama"
+
+    raise ValueError(f"Unsupported provider: {provider}")
+
+
+def _create_sdk_client(provider, base_url, api_key):
+    """Builds a provider SDK client backed by a persistent keep-alive pool."""
+    limits = _pool_limits()
+
+    if provider == "google":
+        if not genai:
+            raise ImportError("google.genai module not found. Install with `pip install google-genai`")
+
+        http_options = None
+        if limits or base_url:
+            http_options = types.HttpOptions(
+                base_url=base_url,
+                client_args={"limits": limits} if limits else None,
+                async_client_args={"limits": limits} if limits else None,
+            )
+        return genai.Client(api_key=api_key, http_options=http_options)
+
+    if not OpenAI:
+        raise ImportError("openai module not found. Install with `pip install openai`")
+
+    http_client = DefaultHttpxClient(limits=limits) if limits else None
+    # Retries are handled by the RequestScheduler, not the SDK
+    return OpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
+
+
+def _create_async_sdk_client(provider, base_url, api_key):
+    """Builds an async SDK client for the currently running event loop."""
+    if provider == "google":
+        # google-genai exposes its async surface on `.aio` of a regular client
+        return _create_sdk_client(provider, base_url, api_key).aio
+
+    if not OpenAI:
+        raise ImportError("openai module not found. Install with `pip install openai`")
+
+    limits = _pool_limits()
+    http_client = DefaultAsyncHttpxClient(limits=limits) if limits else None
+    return AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
+
+
+def get_async_sdk_client(provider, base_url, api_key):
+    """Returns the shared async SDK client for an endpoint on the running loop."""
+    loop = asyncio.get_running_loop()
+    key = (provider, base_url, api_key)
+    with _REGISTRY_LOCK:
+        clients = _ASYNC_SDK_CLIENTS.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = _create_async_sdk_client(provider, base_url, api_key)
+            clients[key] = client
+        return client
+
+
+def _get_background_loop():
+    """Starts (once) a daemon thread running the shared event loop."""
+    global _BACKGROUND_LOOP
+    with _REGISTRY_LOCK:
+        if _BACKGROUND_LOOP is None or _BACKGROUND_LOOP.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="llm-async-loop", daemon=True)
+            thread.start()
+            _BACKGROUND_LOOP = loop
+        return _BACKGROUND_LOOP
+
+
+def run_coroutine(coro, timeout=None):
+    """
+    Runs a coroutine to completion from synchronous code.
+    Uses the shared background loop so async connection pools stay warm between calls.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_background_loop())
+    return future.result(timeout)
+
+
+def get_sdk_client(provider, base_url, api_key):
+    """Returns the shared SDK client for an endpoint, creating it on first use."""
+    key = (provider, base_url, api_key)
+    with _REGISTRY_LOCK:
+        client = _SDK_CLIENTS.get(key)
+        if client is None:
+            logger.info(f"Opening connection pool: Provider={provider}, Endpoint={base_url or 'default'}")
+            client = _create_sdk_client(provider, base_url, api_key)
+            _SDK_CLIENTS[key] = client
+        return client
+
+
+def get_llm_client(provider=None, model_name=None, api_key=None, base_url=None):
+    """
+    Returns a process-wide shared LLMClient.
+    Clients are keyed by (provider, model, base_url, key), so the Keeper, every
+    PlayerAgent and the Researcher reuse the same warm connections.
+    """
+    provider = _resolve_provider(provider)
+    model_name = model_name or os.getenv("LLM_MODEL", "gemini-2.0-flash")
+    resolved_url, resolved_key = _resolve_endpoint(provider, api_key, base_url)
+
+    key = (provider, model_name, resolved_url, resolved_key)
+    with _REGISTRY_LOCK:
+        client = _LLM_CLIENTS.get(key)
+        if client is None:
+            client = LLMClient(provider=provider, model_name=model_name, api_key=api_key, base_url=base_url)
+            _LLM_CLIENTS[key] = client
+        return client
+
+
+def close_llm_clients():
+    """Closes every pooled connection and empties the registries."""
+    with _REGISTRY_LOCK:
+        for client in _SDK_CLIENTS.values():
+            close = getattr(client, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning(f"Failed to close SDK client: {e}")
+        _SDK_CLIENTS.clear()
+        _LLM_CLIENTS.clear()
+        _ASYNC_SDK_CLIENTS.clear()
+
+
+class ResponseCache:
+    """
+    On-disk, content-addressed cache of LLM responses (SQLite).
+    Entries are keyed by a hash of (provider, model, prompt, system prompt, sampling
+    parameters), evicted least-recently-used once the entry or size limit is hit,
+    and optionally expire after `ttl` seconds.
+    With `deterministic_only`, calls with temperature > 0 bypass the cache unless forced.
+    """
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl=RESPONSE_CACHE_TTL,
+                 max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=int(RESPONSE_CACHE_MAX_MB * 1024 * 1024),
+                 deterministic_only=RESPONSE_CACHE_DETERMINISTIC_ONLY):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.deterministic_only = deterministic_only
+        self.hits = 0
+        self.misses = 0
+        self.skips = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(provider, model_name, prompt, system_prompt, temperature, max_tokens, json_mode):
+        """Stable content hash of everything that determines a completion."""
+        payload = json.dumps(
+            [provider, model_name, prompt, system_prompt, temperature, max_tokens, json_mode],
+            ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, temperature, force=False):
+        """Whether a call with these sampling parameters may use the cache."""
+        if force or not self.deterministic_only:
+            return True
+        return temperature is not None and temperature <= 0
+
+    def record_skip(self):
+        """Counts a call that bypassed the cache (see `is_cacheable`)."""
+        with self._lock:
+            self.skips += 1
+
+    def get(self, key):
+        """Returns the cached response or None, counting hits and misses."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        """Stores a response and evicts the least recently used entries if over budget."""
+        if not response or is_system_error(response):
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drops expired entries, then LRU entries until within entry/size limits."""
+        if self.ttl:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            count -= 1
+            total -= row[1]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """Hit/miss counters plus current size, e.g. for logging paid calls saved."""
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skips,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+        }
+
+
+def get_response_cache():
+    """Returns the shared response cache, or None unless enabled with LLM_CACHE=1."""
+    global _RESPONSE_CACHE
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    with _REGISTRY_LOCK:
+        if _RESPONSE_CACHE is None:
+            _RESPONSE_CACHE = ResponseCache()
+        return _RESPONSE_CACHE
+
+
+def _error_text(e):
+    return f"{SYSTEM_ERROR_PREFIX} The investigator's mind is clouded... (API Error: {str(e)})"
+
+
+def is_system_error(text):
+    """True if `text` is the fallback message returned after a failed LLM call."""
+    return isinstance(text, str) and text.startswith(SYSTEM_ERROR_PREFIX)
+
+
 class LLMClient:
     """
     Unified LLM Client for Coc_AI_Runner.
@@ -30,72 +394,221 @@ class LLMClient:
     1. Google Gemini (via google-genai-sdk)
     2. OpenRouter (via openai-sdk)
     3. Ollama (via openai-sdk compatible endpoint)
+
+    Prefer `get_llm_client()` over direct construction so SDK clients and
+    their connection pools are shared across the process.
     """
-    def __init__(self, provider=None, model_name=None, api_key=None, base_url=None):
-        self.provider = provider or os.getenv("LLM_PROVIDER", "google").lower()
+    def __init__(self, provider=None, model_name=None, api_key=None, base_url=None, cache=None):
+        self.provider = _resolve_provider(provider)
         self.model_name = model_name or os.getenv("LLM_MODEL", "gemini-2.0-flash")
         self.api_key = api_key
         self.base_url = base_url
         self.client = None
+        # Optional ResponseCache; defaults to the shared one when LLM_CACHE=1
+        self.cache = cache if cache is not None else get_response_cache()
+        # Retries, rate limits and circuit breaking are shared per provider
+        self.scheduler = get_scheduler(self.provider)
 
         self._initialize_client()
 
     def _initialize_client(self):
-        """Initializes the specific SDK client based on provider."""
+        """Attaches the shared SDK client for this provider/endpoint."""
         logger.info(f"Initializing LLMClient: Provider={self.provider}, Model={self.model_name}")
 
+        self._endpoint = _resolve_endpoint(self.provider, self.api_key, self.base_url)
+        self.client = get_sdk_client(self.provider, *self._endpoint)
+
+    @property
+    def async_client(self):
+        """Async SDK client for the running event loop (must be called inside a coroutine)."""
+        return get_async_sdk_client(self.provider, *self._endpoint)
+
+    def _cache_key(self, prompt, system_prompt, temperature, max_tokens, json_mode, force_cache):
+        """Returns the response-cache key for this call, or None if it must not be cached."""
+        if not self.cache:
+            return None
+        if not self.cache.is_cacheable(temperature, force_cache):
+            self.cache.record_skip()
+            return None
+        return self.cache.make_key(self.provider, self.model_name, prompt, system_prompt, temperature, max_tokens, json_mode)
+
+    @staticmethod
+    def _estimate_tokens(prompt, system_prompt):
+        """Rough input-token estimate for the tokens/min limiter."""
+        return estimate_tokens(prompt) + estimate_tokens(system_prompt) + 1
+
+    def _query(self, *args):
         if self.provider == "google":
-            if not genai:
-                raise ImportError("google.genai module not found. Install with `pip install google-genai`")
-            
-            key = self.api_key or os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-            if not key:
-                raise ValueError("Missing GOOGLE_API_KEY for Google provider.")
-            
-            self.client = genai.Client(api_key=key)
-
-        elif self.provider == "openrouter":
-            if not OpenAI:
-                raise ImportError("openai module not found. Install with `pip install openai`")
-            
-            key = self.api_key or os.getenv("OPENROUTER_API_KEY")
-            if not key:
-                raise ValueError("Missing OPENROUTER_API_KEY for OpenRouter provider.")
-            
-            self.client = OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=key,
-            )
+            return self._query_google(*args)
+        return self._query_openai_compatible(*args)
 
-        elif self.provider == "ollama":
-            if not OpenAI:
-                raise ImportError("openai module not found. Install with `pip install openai`")
-            
-            # Ollama local endpoint
-            base = self.base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1")
-            self.client = OpenAI(
-                base_url=base,
-                api_key="ollama", # Key is required but ignored by Ollama
-            )
+    async def _aquery(self, *args):
+        if self.provider == "google":
+            return await self._aquery_google(*args)
+        return await self._aquery_openai_compatible(*args)
 
+    def _start_stream(self, *args):
+        """Opens the stream and pulls the first chunk, so connection errors surface here (and can be retried)."""
+        if self.provider == "google":
+            chunks = iter(self._stream_google(*args))
         else:
-            raise ValueError(f"Unsupported provider: {self.provider}")
+            chunks = iter(self._stream_openai_compatible(*args))
+        return next(chunks, None), chunks
 
-    def get_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=8192, json_mode=False):
+    def get_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=8192, json_mode=False, force_cache=False, static_prefix=None):
         """
         Unified method to get a text completion.
+        Transient errors (429, 5xx, dropped connections) are retried by the provider's
+        RequestScheduler; only a final failure returns a [SYSTEM ERROR] string.
+        `force_cache` allows caching even when temperature > 0 in deterministic-only mode.
+        `static_prefix` is the stable leading part of `system_prompt`; providers that
+        support prompt caching register it once and only pay for the remainder per turn.
+        """
+        cache_key = self._cache_key(prompt, system_prompt, temperature, max_tokens, json_mode, force_cache)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        args = (prompt, system_prompt, temperature, max_tokens, json_mode, static_prefix)
+        try:
+            text = self.scheduler.run(lambda: self._query(*args), self._estimate_tokens(prompt, system_prompt))
+        except Exception as e:
+            logger.error(f"LLM Generation Error: {e}")
+            return _error_text(e)
+
+        if cache_key:
+            self.cache.put(cache_key, text)
+        return text
+
+    def stream_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=8192, json_mode=False, force_cache=False, static_prefix=None):
+        """
+        Yields the completion as text chunks while it is being generated.
+        Opening the stream is retried like `get_completion`; a failure after the first
+        chunk is yielded as a final [SYSTEM ERROR] chunk, and callers must then discard
+        the text already received. A cached response is yielded as a single chunk.
         """
+        cache_key = self._cache_key(prompt, system_prompt, temperature, max_tokens, json_mode, force_cache)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        args = (prompt, system_prompt, temperature, max_tokens, json_mode, static_prefix)
+        parts = []
         try:
-            if self.provider == "google":
-                return self._query_google(prompt, system_prompt, temperature, max_tokens, json_mode)
-            elif self.provider in ["openrouter", "ollama"]:
-                return self._query_openai_compatible(prompt, system_prompt, temperature, max_tokens, json_mode)
+            first, chunks = self.scheduler.run(lambda: self._start_stream(*args), self._estimate_tokens(prompt, system_prompt))
+            if first:
+                parts.append(first)
+                yield first
+            for chunk in chunks:
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+        except Exception as e:
+            logger.error(f"LLM Streaming Error: {e}")
+            yield _error_text(e)
+            return
+
+        if cache_key:
+            self.cache.put(cache_key, "".join(parts))
+
+    async def aget_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=8192, json_mode=False, force_cache=False, static_prefix=None):
+        """
+        Async variant of `get_completion`, safe to fan out with asyncio.gather.
+        """
+        cache_key = self._cache_key(prompt, system_prompt, temperature, max_tokens, json_mode, force_cache)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        args = (prompt, system_prompt, temperature, max_tokens, json_mode, static_prefix)
+        try:
+            text = await self.scheduler.arun(lambda: self._aquery(*args), self._estimate_tokens(prompt, system_prompt))
         except Exception as e:
             logger.error(f"LLM Generation Error: {e}")
-            return f"[SYSTEM ERROR] The investigator's mind is clouded... (API Error: {str(e)})"
+            return _error_text(e)
 
-    def _query_google(self, prompt, system_prompt, temperature, max_tokens, json_mode):
-        """Handles Google Gemini API calls."""
+        if cache_key:
+            self.cache.put(cache_key, text)
+        return text
+
+    def _context_cache_key(self, static_prefix):
+        digest = hashlib.sha256(static_prefix.encode("utf-8")).hexdigest()
+        return (self._endpoint[1], self.model_name, digest)
+
+    @staticmethod
+    def _lookup_context_cache(key):
+        """(True, name) for an unexpired entry (name may be None: not cacheable), else (False, None)."""
+        with _CONTEXT_CACHE_LOCK:
+            entry = _CONTEXT_CACHES.get(key)
+        if entry and entry[1] > time.time():
+            return True, entry[0]
+        return False, None
+
+    def _gemini_cached_content(self, static_prefix):
+        """
+        Returns the name of a Gemini cached content holding `static_prefix` as system
+        instruction, creating it once per process (and again after it expires).
+        Returns None if caching is disabled or the prefix cannot be cached; a failed
+        creation is remembered for CONTEXT_CACHE_RETRY seconds. Blocks on the API call,
+        so async callers go through `_agemini_cached_content`.
+        """
+        if not CONTEXT_CACHE_ENABLED or not static_prefix:
+            return None
+
+        key = self._context_cache_key(static_prefix)
+        found, name = self._lookup_context_cache(key)
+        if found:
+            return name
+
+        with _CONTEXT_CACHE_LOCK:
+            create_lock = _CONTEXT_CACHE_CREATE_LOCKS.setdefault(key, threading.Lock())
+        with create_lock:
+            # Another thread may have created it while this one waited
+            found, name = self._lookup_context_cache(key)
+            if found:
+                return name
+            try:
+                cached = self.client.caches.create(
+                    model=self.model_name,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=static_prefix,
+                        display_name=f"coc-prefix-{key[2][:12]}",
+                        ttl=f"{CONTEXT_CACHE_TTL}s",
+                    )
+                )
+                # Renewed a minute early so a request never references an expired cache
+                entry = (cached.name, time.time() + CONTEXT_CACHE_TTL - 60)
+                logger.info(f"Registered Gemini context cache {cached.name} for model {self.model_name}")
+            except Exception as e:
+                # Typically the prefix is below the model's minimum cacheable size
+                logger.info(f"Gemini context caching unavailable for {CONTEXT_CACHE_RETRY}s, sending full prompt: {e}")
+                entry = (None, time.time() + CONTEXT_CACHE_RETRY)
+            with _CONTEXT_CACHE_LOCK:
+                _CONTEXT_CACHES[key] = entry
+            return entry[0]
+
+    async def _agemini_cached_content(self, static_prefix):
+        """Async variant: a known entry is returned directly; creation runs on a worker thread."""
+        if not CONTEXT_CACHE_ENABLED or not static_prefix:
+            return None
+        found, name = self._lookup_context_cache(self._context_cache_key(static_prefix))
+        if found:
+            return name
+        return await asyncio.to_thread(self._gemini_cached_content, static_prefix)
+
+    @staticmethod
+    def _cacheable_prefix(prompt, system_prompt, temperature, max_tokens, json_mode, static_prefix=None):
+        """The request's stable system-prompt prefix, if it can go into a context cache."""
+        if static_prefix and system_prompt and system_prompt.startswith(static_prefix):
+            return static_prefix
+        return None
+
+    def _google_request(self, prompt, system_prompt, temperature, max_tokens, json_mode, static_prefix=None, cache_name=None):
+        """Builds the keyword arguments for a Gemini generate_content call (`cache_name` holds `static_prefix`)."""
         config_args = {
             "system_instruction": system_prompt,
             "temperature": temperature,
@@ -105,18 +618,46 @@ class LLMClient:
         if json_mode:
             config_args["response_mime_type"] = "application/json"
 
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            contents=prompt,
-            config=types.GenerateContentConfig(**config_args)
+        contents = prompt
+        if cache_name:
+            # Cached content already carries the system instruction; the per-turn
+            # remainder of the system prompt travels with the user content instead.
+            config_args["system_instruction"] = None
+            config_args["cached_content"] = cache_name
+            remainder = system_prompt[len(static_prefix):].strip()
+            if remainder:
+                contents = f"{remainder}\n\n{prompt}"
+
+        return {
+            "model": self.model_name,
+            "contents": contents,
+            "config": types.GenerateContentConfig(**config_args),
+        }
+
+    def _openai_system_message(self, system_prompt, static_prefix):
+        """System message, split at the stable prefix with a cache breakpoint where supported."""
+        use_breakpoint = (
+            CONTEXT_CACHE_ENABLED
+            and self.provider == "openrouter"
+            and static_prefix
+            and system_prompt.startswith(static_prefix)
+            and self.model_name.startswith(OPENROUTER_CACHE_CONTROL_PREFIXES)
         )
-        return response.text
+        if not use_breakpoint:
+            # Other providers (and Ollama's KV cache) reuse a byte-identical prefix automatically
+            return {"role": "system", "content": system_prompt}
 
-    def _query_openai_compatible(self, prompt, system_prompt, temperature, max_tokens, json_mode):
-        """Handles OpenRouter and Ollama calls via OpenAI SDK."""
+        parts = [{"type": "text", "text": static_prefix, "cache_control": {"type": "ephemeral"}}]
+        remainder = system_prompt[len(static_prefix):]
+        if remainder.strip():
+            parts.append({"type": "text", "text": remainder})
+        return {"role": "system", "content": parts}
+
+    def _openai_request(self, prompt, system_prompt, temperature, max_tokens, json_mode, static_prefix=None):
+        """Builds the keyword arguments for an OpenAI-compatible chat completion."""
         messages = []
         if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
+            messages.append(self._openai_system_message(system_prompt, static_prefix))
         
         messages.append({"role": "user", "content": prompt})
 
@@ -124,15 +665,47 @@ class LLMClient:
 
         # Note: 'max_tokens' handling varies, OpenRouter/Ollama usually respect it.
         # Ollama sometimes needs 'num_predict' in raw mode, but v1 compat should handle max_tokens.
-        
-        completion = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            response_format=response_format
-        )
-        
+        return {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "response_format": response_format,
+        }
+
+    def _query_google(self, *args):
+        """Handles Google Gemini API calls."""
+        cache_name = self._gemini_cached_content(self._cacheable_prefix(*args))
+        response = self.client.models.generate_content(**self._google_request(*args, cache_name=cache_name))
+        return response.text
+
+    async def _aquery_google(self, *args):
+        """Handles Google Gemini API calls on the async client."""
+        cache_name = await self._agemini_cached_content(self._cacheable_prefix(*args))
+        response = await self.async_client.models.generate_content(**self._google_request(*args, cache_name=cache_name))
+        return response.text
+
+    def _stream_google(self, *args):
+        """Streams Google Gemini output chunk by chunk."""
+        cache_name = self._gemini_cached_content(self._cacheable_prefix(*args))
+        for chunk in self.client.models.generate_content_stream(**self._google_request(*args, cache_name=cache_name)):
+            yield chunk.text
+
+    def _query_openai_compatible(self, *args):
+        """Handles OpenRouter and Ollama calls via OpenAI SDK."""
+        completion = self.client.chat.completions.create(**self._openai_request(*args))
+        return completion.choices[0].message.content
+
+    def _stream_openai_compatible(self, *args):
+        """Streams OpenRouter and Ollama output via the OpenAI SDK."""
+        stream = self.client.chat.completions.create(stream=True, **self._openai_request(*args))
+        for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content
+
+    async def _aquery_openai_compatible(self, *args):
+        """Handles OpenRouter and Ollama calls via the async OpenAI SDK."""
+        completion = await self.async_client.chat.completions.create(**self._openai_request(*args))
         return completion.choices[0].message.content
 
     def check_connection(self):
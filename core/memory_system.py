@@ -1,47 +1,256 @@
 import json
 import os
-from typing import Dict, List, Any
+import queue
+import atexit
+import threading
+from typing import Dict, List, Any, Iterator, Optional
+
+
+class FileMemoryBackend:
+    """Snapshot (`<name>_memory.json`) plus append-only journal (`<name>_memory.journal.jsonl`)."""
+    def __init__(self, save_dir: str, name: str):
+        self.memory_file = os.path.join(save_dir, f"{name}_memory.json")
+        self.journal_file = os.path.join(save_dir, f"{name}_memory.journal.jsonl")
+
+    def read_snapshot(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.memory_file):
+            return None
+        with open(self.memory_file, 'r') as f:
+            return json.load(f)
+
+    def write_snapshot(self, data: Dict[str, Any]):
+        """Writes the snapshot atomically and truncates the journal."""
+        os.makedirs(os.path.dirname(self.memory_file), exist_ok=True)
+        tmp_file = f"{self.memory_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.memory_file)
+        if os.path.exists(self.journal_file):
+            open(self.journal_file, 'w').close()
+
+    def append(self, ops: List[Dict[str, Any]]):
+        os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+
+    def read_ops(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.journal_file):
+            return
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return  # Torn write from a crash: everything before it is valid
+
 
 class MemorySystem:
-    def __init__(self, save_dir: str = "data/saves"):
+    """
+    Shared narrative memory persisted as a snapshot plus an append-only journal of
+    buffer/context mutations, through a backend (files by default, or a session in
+    core.session_store.SessionStore).
+    Each mutation appends one small journal entry; the journal is compacted into the
+    snapshot every `compact_every` entries and replayed on load for crash recovery.
+    With `write_behind=True` journal writes are coalesced on a background thread;
+    call `flush()` to wait until everything is on disk, and `close()` when done with
+    the memory to stop the thread.
+    """
+    def __init__(self, save_dir: str = "data/saves", write_behind: bool = False, compact_every: int = 50):
         self.save_dir = save_dir
-        self.memory_file = None
+        self.backend = None
         self.data = {
             "global_context": {
                 "summary": "The investigation begins.",
                 "key_clues": [],
                 "location_state": "Unknown location.",
-                "turn_count": 0
+                "turn_count": 0,
+                "recent_summaries": []  # Newest detailed summaries; older ones are condensed into "summary"
             },
             "character_memories": {},
-            "short_term_buffer": []  # <--- NEW: Stores recent conversation for summarization
+            "short_term_buffer": [],  # <--- NEW: Stores recent conversation for summarization
+            "journal_seq": 0  # Sequence number of the last mutation included in this data
         }
         self.summary_threshold = 5  # Summarize every 5 turns (adjust as needed)
+        # Bounds of the hierarchical summary: recent detail + one condensed block
+        self.max_recent_summaries = 3
+        self.max_entry_chars = 600
+        self.max_summary_chars = 1200
+        self.max_key_clues = 40  # Oldest clues are forgotten beyond this
+        self.compact_every = compact_every
+        self.write_behind = write_behind
 
-    def load_memory(self, campaign_name: str):
-        """Loads the memory file associated with a campaign/save."""
-        self.memory_file = os.path.join(self.save_dir, f"{campaign_name}_memory.json")
-        if os.path.exists(self.memory_file):
-            with open(self.memory_file, 'r') as f:
-                loaded_data = json.load(f)
+        self._journal_entries = 0
+        self._io_lock = threading.RLock()  # Guards self.data and the files
+        self._queue = None
+        self._writer = None
+        if write_behind:
+            self._queue = queue.Queue()
+            self._writer = threading.Thread(target=self._writer_loop, args=(self._queue,), name="memory-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+
+    def load_memory(self, campaign_name: str, backend=None):
+        """
+        Loads the memory snapshot for a campaign/save and replays its journal on top.
+        `backend` overrides the default `<campaign_name>_memory.*` files in `save_dir`.
+        """
+        self.backend = backend or FileMemoryBackend(self.save_dir, campaign_name)
+        with self._io_lock:
+            loaded_data = self.backend.read_snapshot()
+            if loaded_data:
                 # Merge loaded data with defaults to ensure new fields exist
                 self.data.update(loaded_data)
                 if "short_term_buffer" not in self.data:
                     self.data["short_term_buffer"] = []
-        else:
-            self.save_memory()
+                self.data["global_context"].setdefault("recent_summaries", [])
+
+            replayed = self._replay_journal()
+            if replayed or not loaded_data:
+                # Fold recovered mutations into a fresh snapshot
+                self.save_memory()
+
+    def _replay_journal(self) -> int:
+        """Applies journal entries written after the last snapshot. Returns how many were applied."""
+        if not self.backend:
+            return 0
+        applied = 0
+        for op in self.backend.read_ops():
+            if op.get("seq", 0) <= self.data.get("journal_seq", 0):
+                continue  # Already part of the snapshot
+            self._apply(op)
+            applied += 1
+        return applied
 
     def save_memory(self):
-        """Persists the current memory state to JSON."""
-        if self.memory_file:
-            os.makedirs(os.path.dirname(self.memory_file), exist_ok=True)
-            with open(self.memory_file, 'w') as f:
-                json.dump(self.data, f, indent=2)
+        """Writes a full snapshot atomically and truncates the journal (compaction)."""
+        if not self.backend:
+            return
+        with self._io_lock:
+            self.backend.write_snapshot(self.data)
+            self._journal_entries = 0
+
+    # --- JOURNAL ---
+
+    def _record(self, op: Dict[str, Any]):
+        """Applies a mutation in memory and journals it (directly or via the writer thread)."""
+        with self._io_lock:
+            op["seq"] = self.data.get("journal_seq", 0) + 1
+            self._apply(op)
+            if not self.backend:
+                return
+            if self._queue is not None:
+                self._queue.put(op)
+                return
+            self._append_journal([op])
+
+    def _append_journal(self, ops: List[Dict[str, Any]]):
+        """Appends ops to the journal; ops already covered by a newer snapshot are harmless (skipped on replay)."""
+        with self._io_lock:
+            self.backend.append(ops)
+            self._journal_entries += len(ops)
+            if self._journal_entries >= self.compact_every:
+                self.save_memory()
+
+    def _writer_loop(self, ops_queue):
+        """Background writer: drains queued mutations and appends them in one write; None stops it."""
+        while True:
+            items = [ops_queue.get()]
+            while True:
+                try:
+                    items.append(ops_queue.get_nowait())
+                except queue.Empty:
+                    break
+            ops = [op for op in items if op is not None]
+            try:
+                if ops:
+                    self._append_journal(ops)
+            except Exception as e:
+                print(f"[MEMORY] Journal write failed: {e}")
+            finally:
+                for _ in items:
+                    ops_queue.task_done()
+            if len(ops) < len(items):
+                return
+
+    def flush(self):
+        """Blocks until all pending write-behind mutations have been written."""
+        if self._queue is not None:
+            self._queue.join()
+
+    def close(self):
+        """
+        Flushes pending writes and stops the write-behind thread. The memory stays usable;
+        later mutations are journaled synchronously.
+        """
+        if self._queue is None:
+            return
+        with self._io_lock:
+            # Queued before the sentinel, so the writer drains every pending op first
+            self._queue.put(None)
+            writer, self._queue = self._writer, None
+        writer.join()
+        self._writer = None
+        atexit.unregister(self.flush)
+
+    def _apply(self, op: Dict[str, Any]):
+        """Applies one journaled mutation to `self.data` (used live and during replay)."""
+        self.data["journal_seq"] = op.get("seq", self.data.get("journal_seq", 0))
+        kind = op.get("op")
+        if kind == "buffer_add":
+            self.data["short_term_buffer"].append(op["entry"])
+        elif kind == "buffer_clear":
+            self.data["short_term_buffer"] = []
+        elif kind == "context":
+            self._apply_context(op.get("summary"), op.get("new_clues"), op.get("location"))
+        elif kind == "summary_commit":
+            del self.data["short_term_buffer"][:op.get("consumed", 0)]
+            self._push_summary(op["summary"], op.get("condensed"))
+
+    def _push_summary(self, summary: str, condensed: str = None):
+        """
+        Adds a summary to the recent tier. Entries pushed out of the tier are folded into
+        the condensed "summary" block: `condensed` if the summarizer provided one,
+        otherwise by clipping (oldest text is dropped first).
+        """
+        ctx = self.data["global_context"]
+        recent = ctx.setdefault("recent_summaries", [])
+        recent.append(_clip_head(summary.strip(), self.max_entry_chars))
+
+        overflow = recent[:-self.max_recent_summaries]
+        if overflow:
+            del recent[:-self.max_recent_summaries]
+        if condensed is None and overflow:
+            older = ctx.get("summary", "")
+            parts = ([] if older == "The investigation begins." else [older]) + overflow
+            condensed = "\n".join(p for p in parts if p)
+        if condensed is not None:
+            ctx["summary"] = _clip_tail(condensed.strip(), self.max_summary_chars)
+
+    def _apply_context(self, summary, new_clues, location):
+        if summary:
+            self._push_summary(summary)
+
+        if new_clues:
+            existing = set(self.data["global_context"].get("key_clues", []))
+            for clue in new_clues:
+                if clue not in existing:
+                    self.data["global_context"].setdefault("key_clues", []).append(clue)
+                    existing.add(clue)
+            del self.data["global_context"]["key_clues"][:-self.max_key_clues]
+
+        if location:
+            self.data["global_context"]["location_state"] = location
+
+    # --- PUBLIC API ---
 
     def add_to_buffer(self, role: str, content: str):
         """Adds a message to the short-term buffer."""
-        self.data["short_term_buffer"].append(f"{role}: {content}")
-        self.save_memory()
+        self._record({"op": "buffer_add", "entry": f"{role}: {content}"})
 
     def should_summarize(self) -> bool:
         """Checks if the buffer has reached the threshold."""
@@ -53,42 +262,101 @@ class MemorySystem:
 
     def clear_buffer(self):
         """Clears the short-term buffer after summarization."""
-        self.data["short_term_buffer"] = []
-        self.save_memory()
+        self._record({"op": "buffer_clear"})
 
     def update_global_context(self, summary: str = None, new_clues: List[str] = None, location: str = None):
         """Updates the shared narrative context."""
-        if summary:
-            # Append new summary to existing summary, keeping it concise
-            current_summary = self.data["global_context"].get("summary", "")
-            # Simple concatenation for now, ideal would be full rewrite
-            if current_summary == "The investigation begins.":
-                self.data["global_context"]["summary"] = summary
-            else:
-                self.data["global_context"]["summary"] = f"{current_summary}\n\n[UPDATE]: {summary}"
-                
-        if new_clues:
-            existing = set(self.data["global_context"].get("key_clues", []))
-            for clue in new_clues:
-                if clue not in existing:
-                    self.data["global_context"].setdefault("key_clues", []).append(clue)
-                    
-        if location:
-            self.data["global_context"]["location_state"] = location
-        
-        self.save_memory()
+        self._record({"op": "context", "summary": summary, "new_clues": new_clues, "location": location})
+
+    def get_buffer_entries(self) -> List[str]:
+        """Returns a copy of the short-term buffer (safe to read from a worker thread)."""
+        with self._io_lock:
+            return list(self.data["short_term_buffer"])
 
-    def get_global_context_str(self) -> str:
-        """Returns a formatted string of the global context for the LLM."""
+    def pending_overflow(self) -> List[str]:
+        """Recent summaries that the next pushed summary will move into the condensed block."""
+        with self._io_lock:
+            recent = self.data["global_context"].get("recent_summaries", [])
+            return list(recent[:max(0, len(recent) + 1 - self.max_recent_summaries)])
+
+    def commit_summary(self, summary: str, consumed: int, condensed: str = None):
+        """
+        Stores a summary of the first `consumed` buffer entries and drops them from the buffer
+        (entries added while the summary was being written are kept).
+        """
+        self._record({"op": "summary_commit", "summary": summary, "consumed": consumed, "condensed": condensed})
+
+    def get_story_summary(self) -> str:
+        """The condensed summary followed by the recent summaries, oldest first (empty if none yet)."""
+        with self._io_lock:
+            ctx = self.data["global_context"]
+            earlier = ctx.get("summary", "")
+            parts = ([] if earlier == "The investigation begins." else [earlier]) + list(ctx.get("recent_summaries", []))
+        return "\n".join(part for part in parts if part)
+
+    def get_global_context_str(self, max_chars: int = None) -> str:
+        """
+        Returns a formatted string of the global context for the LLM.
+        With `max_chars`, each section is budgeted: the newest clues get up to half of the
+        room, then the newest recent summaries, then the tail of the condensed summary,
+        so the oldest information is dropped first.
+        """
         ctx = self.data["global_context"]
-        summary = ctx.get("summary", "No summary yet.")
         location = ctx.get("location_state", "Unknown")
-        clues = ", ".join(ctx.get("key_clues", []))
-        
-        return (
-            f"--- CURRENT SITUATION (GLOBAL MEMORY) ---\n"
-            f"SUMMARY: {summary}\n"
-            f"LOCATION: {location}\n"
-            f"KNOWN CLUES: {clues}\n"
-            f"-----------------------------------------"
-        )
+
+        def render(earlier, recent, clues):
+            recent_str = "".join(f"\n- {entry}" for entry in recent)
+            return (
+                f"--- CURRENT SITUATION (GLOBAL MEMORY) ---\n"
+                f"SUMMARY: {earlier}\n"
+                + (f"RECENT EVENTS:{recent_str}\n" if recent else "")
+                + f"LOCATION: {location}\n"
+                f"KNOWN CLUES: {', '.join(clues)}\n"
+                f"-----------------------------------------"
+            )
+
+        earlier = ctx.get("summary", "No summary yet.")
+        recent = list(ctx.get("recent_summaries", []))
+        clues = list(ctx.get("key_clues", []))
+        text = render(earlier, recent, clues)
+        if max_chars is None or len(text) <= max_chars:
+            return text
+
+        room = max_chars - len(render("", [], []))
+        if room <= 0:
+            return text[:max_chars]  # Not even the section headers fit
+
+        # The newest clue may use all the room, more clues up to half (+2: the first has no ", ")
+        clue_room = min(room, max(room // 2, len(clues[-1]) if clues else 0))
+        kept_clues = _newest_fitting(clues, clue_room + 2, overhead=2)
+        room -= len(", ".join(kept_clues))
+        kept_recent = _newest_fitting(recent, room - len("RECENT EVENTS:\n"), overhead=len("\n- "))
+        if kept_recent:
+            room -= len(render("", kept_recent, [])) - len(render("", [], []))
+        return render(_clip_tail(earlier, max(0, room)), kept_recent, kept_clues)
+
+
+def _newest_fitting(items: List[str], max_chars: int, overhead: int) -> List[str]:
+    """The longest run of newest `items` whose lengths plus `overhead` chars each fit in `max_chars`."""
+    kept, used = [], 0
+    for item in reversed(items):
+        cost = len(item) + overhead
+        if used + cost > max_chars:
+            break
+        kept.append(item)
+        used += cost
+    return kept[::-1]
+
+
+def _clip_head(text: str, max_chars: int) -> str:
+    """Keeps the beginning of `text`."""
+    return text if len(text) <= max_chars else text[:max(0, max_chars - 3)].rstrip() + "..."
+
+
+def _clip_tail(text: str, max_chars: int) -> str:
+    """Keeps the end of `text` (the most recent part of a chronological summary)."""
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 3:
+        return ""
+    return "..." + text[len(text) - max_chars + 3:].lstrip()
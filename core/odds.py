@@ -0,0 +1,220 @@
+import numpy as np
+
+from core.rules import compile_dice, compile_loss
+
+# Success levels, worst to best (names match core.rules.check_success)
+FUMBLE, FAILURE, REGULAR, HARD, EXTREME, CRITICAL = range(6)
+LEVEL_NAMES = ('Fumble', 'Failure', 'Regular Success', 'Hard Success', 'Extreme Success', 'Critical Success')
+
+SKILLS = np.arange(101)
+ROLLS = np.arange(1, 101)
+
+
+def success_levels(rolls, skill):
+    """
+    Vectorized check_success: success level (FUMBLE..CRITICAL) for each d100 roll.
+    `rolls` and `skill` broadcast against each other.
+    """
+    rolls, skill = np.broadcast_arrays(np.asarray(rolls), np.asarray(skill))
+    levels = np.full(rolls.shape, FAILURE, dtype=np.int8)
+    levels[rolls <= skill] = REGULAR
+    levels[rolls <= skill / 2] = HARD
+    levels[rolls <= skill / 5] = EXTREME
+    levels[((rolls >= 96) & (skill < 50)) | (rolls == 100)] = FUMBLE
+    levels[rolls == 1] = CRITICAL
+    return levels
+
+
+# LEVEL_TABLE[skill, roll - 1] -> success level, for every skill 0-100 and roll 1-100
+LEVEL_TABLE = success_levels(ROLLS[None, :], SKILLS[:, None])
+
+
+def _net_dice(bonus, penalty):
+    """Bonus and penalty dice cancel one for one; returns the net signed count."""
+    return int(bonus) - int(penalty)
+
+
+def d100_pmf(bonus=0, penalty=0):
+    """
+    Exact probability of each d100 result 1-100 (index 0 = result 1) with bonus or
+    penalty dice. Each extra tens die is paired with the shared units die and the
+    lowest (bonus) or highest (penalty) total is kept, 00 + 0 counting as 100.
+    """
+    net = _net_dice(bonus, penalty)
+    tens_dice = 1 + abs(net)
+    pmf = np.zeros(100)
+    for units in range(10):
+        values = np.arange(10) * 10 + units
+        values[values == 0] = 100
+        # P(one die's total <= x), then the CDF of the kept total
+        cdf_one = np.searchsorted(np.sort(values), ROLLS, side='right') / 10
+        cdf = 1 - (1 - cdf_one) ** tens_dice if net >= 0 else cdf_one ** tens_dice
+        pmf += np.diff(cdf, prepend=0.0) / 10
+    return pmf
+
+
+def roll_d100(n, rng=None, bonus=0, penalty=0):
+    """Rolls `n` d100 checks at once (int16 array) with bonus/penalty dice."""
+    rng = rng if rng is not None else np.random.default_rng()
+    net = _net_dice(bonus, penalty)
+    units = rng.integers(0, 10, size=n)
+    values = rng.integers(0, 10, size=(1 + abs(net), n)) * 10 + units
+    values[values == 0] = 100
+    kept = values.min(axis=0) if net >= 0 else values.max(axis=0)
+    return kept.astype(np.int16)
+
+
+def _skills(skills):
+    return np.clip(np.atleast_1d(np.asarray(skills, dtype=int)), 0, 100)
+
+
+def _level_probs(roll_pmf, skills):
+    """Success-level probabilities (len(skills), 6) given a d100 result distribution."""
+    return np.stack([
+        np.bincount(LEVEL_TABLE[skill], weights=roll_pmf, minlength=len(LEVEL_NAMES))
+        for skill in skills
+    ])
+
+
+def success_table(skills=SKILLS, bonus=0, penalty=0, pushed=False, exact=True, n=1_000_000, rng=None):
+    """
+    Probability of each success level per skill value: array (len(skills), 6) indexed
+    by FUMBLE..CRITICAL. With `pushed`, a plain Failure is rerolled once (without the
+    bonus/penalty dice) and the second result stands; fumbles cannot be pushed.
+    `exact=False` estimates the table from `n` simulated rolls instead.
+    """
+    skills = _skills(skills)
+    if exact:
+        table = _level_probs(d100_pmf(bonus, penalty), skills)
+        if pushed:
+            failed = table[:, [FAILURE]]
+            table[:, FAILURE] = 0.0
+            table += failed * _level_probs(d100_pmf(), skills)
+        return table
+
+    rng = rng if rng is not None else np.random.default_rng()
+    rolls = roll_d100(n, rng, bonus, penalty) - 1
+    if not pushed:
+        # Levels depend only on the roll: histogram once, then map through LEVEL_TABLE
+        return _level_probs(np.bincount(rolls, minlength=100) / n, skills)
+
+    pushes = roll_d100(n, rng) - 1
+    table = np.zeros((len(skills), len(LEVEL_NAMES)))
+    for row, skill in enumerate(skills):
+        levels = LEVEL_TABLE[skill][rolls]
+        levels = np.where(levels == FAILURE, LEVEL_TABLE[skill][pushes], levels)
+        table[row] = np.bincount(levels, minlength=len(LEVEL_NAMES)) / n
+    return table
+
+
+def success_chance(skill, bonus=0, penalty=0, pushed=False):
+    """Exact probability of at least a Regular Success."""
+    return float(success_table([skill], bonus, penalty, pushed)[0, REGULAR:].sum())
+
+
+def _opposed_outcome(tier_a, tier_b, skill_a, skill_b):
+    """+1 where A wins, -1 where B wins, 0 for no winner (both fail or a full tie)."""
+    tie_break = np.sign(skill_a - skill_b)
+    return np.where(tier_a != tier_b, np.sign(tier_a - tier_b),
+                    np.where(tier_a == FAILURE, 0, tie_break))
+
+
+def opposed_odds(skill_a, skill_b, bonus_a=0, penalty_a=0, bonus_b=0, penalty_b=0, exact=True, n=1_000_000, rng=None):
+    """
+    Opposed roll: the higher success level wins, a tie goes to the higher skill and
+    nobody wins if both fail. Returns {'a': p, 'b': p, 'none': p}.
+    """
+    if exact:
+        probs_a = success_table([skill_a], bonus_a, penalty_a)[0]
+        probs_b = success_table([skill_b], bonus_b, penalty_b)[0]
+        # Fumbles count as plain failures when comparing levels
+        probs_a[FAILURE] += probs_a[FUMBLE]
+        probs_b[FAILURE] += probs_b[FUMBLE]
+        tiers = np.arange(FAILURE, len(LEVEL_NAMES))
+        joint = np.outer(probs_a[FAILURE:], probs_b[FAILURE:])
+        outcome = _opposed_outcome(tiers[:, None], tiers[None, :], skill_a, skill_b)
+    else:
+        rng = rng if rng is not None else np.random.default_rng()
+        tier_a = np.maximum(LEVEL_TABLE[_skills(skill_a)[0]][roll_d100(n, rng, bonus_a, penalty_a) - 1], FAILURE)
+        tier_b = np.maximum(LEVEL_TABLE[_skills(skill_b)[0]][roll_d100(n, rng, bonus_b, penalty_b) - 1], FAILURE)
+        outcome = _opposed_outcome(tier_a, tier_b, skill_a, skill_b)
+        joint = np.full(n, 1.0 / n)
+    return {
+        'a': float(joint[outcome > 0].sum()),
+        'b': float(joint[outcome < 0].sum()),
+        'none': float(joint[outcome == 0].sum()),
+    }
+
+
+# --- SANITY ---
+
+def loss_pmf(expr):
+    """Exact distribution of a SAN loss like '5', '1d6', '2d4+1' (index = points lost, never negative)."""
+    low, probs = (expr if hasattr(expr, 'pmf') else compile_dice(expr)).pmf()
+    values = np.maximum(np.arange(low, low + len(probs)), 0)
+    return np.bincount(values, weights=probs)
+
+
+def sanity_odds(sanity, losses, exact=True, n=200_000, rng=None):
+    """
+    Outcome of a sequence of SAN checks (e.g. a scene's `sanity_events` losses like
+    '0/1d3'). Each check succeeds on d100 <= current SAN, as in core.rules.sanity_check.
+    Returns:
+      mean_loss          expected total SAN lost
+      p_zero             chance SAN reaches 0 (permanent insanity)
+      p_temporary        chance a single check costs 5+ SAN (temporary insanity, before the INT roll)
+      p_indefinite       chance the total loss reaches 1/5 of the starting SAN
+      final_sanity       probability of each final SAN value (index = SAN)
+    `exact=True` runs a dynamic program over SAN values; otherwise `n` simulated runs.
+    """
+    sanity = int(max(0, min(sanity, 99)))
+    splits = [compile_loss(loss) for loss in losses]  # Parsed once per distinct loss string
+    if exact:
+        # state[temporary_flag, san]
+        state = np.zeros((2, sanity + 1))
+        state[0, sanity] = 1.0
+        for on_success, on_failure in splits:
+            pmfs = (loss_pmf(on_success), loss_pmf(on_failure))
+            nxt = np.zeros_like(state)
+            for san in range(sanity + 1):
+                mass = state[:, san]
+                if not mass.any():
+                    continue
+                p_success = min(san, 100) / 100
+                for pmf, weight in zip(pmfs, (p_success, 1 - p_success)):
+                    for lost in np.nonzero(pmf)[0]:
+                        prob = weight * pmf[lost]
+                        target = max(0, san - int(lost))
+                        if lost >= 5:
+                            nxt[1, target] += prob * mass.sum()
+                        else:
+                            nxt[:, target] += prob * mass
+            state = nxt
+        final = state.sum(axis=0)
+        p_temporary = float(state[1].sum())
+    else:
+        rng = rng if rng is not None else np.random.default_rng()
+        current = np.full(n, sanity)
+        temporary = np.zeros(n, dtype=bool)
+        for on_success, on_failure in splits:
+            success = roll_d100(n, rng) <= current
+            lost = np.maximum(np.where(success, on_success.roll_many(n, rng), on_failure.roll_many(n, rng)), 0)
+            temporary |= lost >= 5
+            current = np.maximum(current - lost, 0)
+        final = np.bincount(current, minlength=sanity + 1) / n
+        p_temporary = float(temporary.mean())
+
+    lost = sanity - np.arange(sanity + 1)
+    return {
+        'mean_loss': float((final * lost).sum()),
+        'p_zero': float(final[0]),
+        'p_temporary': p_temporary,
+        'p_indefinite': float(final[lost >= max(1, sanity / 5)].sum()),
+        'final_sanity': final,
+    }
+
+
+def scene_sanity_odds(campaign_index, scene_id, sanity, **kwargs):
+    """sanity_odds for every `sanity_events` entry of a scene in a CampaignIndex."""
+    events = campaign_index.sanity_events.get(scene_id, [])
+    return sanity_odds(sanity, [event.get('loss', '0') for event in events], **kwargs)
@@ -1,29 +1,84 @@
-import chromadb
-from chromadb.utils import embedding_functions
 import os
+import time
 import hashlib
+import threading
+
+# Chroma is optional: it provides the default embedding model and the "chroma" backend
+try:
+    from chromadb.utils import embedding_functions
+except ImportError:
+    embedding_functions = None
+
+from core.embedding_cache import EmbeddingCache, CachedEmbedder
+from core.vector_store import ChromaVectorStore, NumpyVectorStore, build_where
+from core.lexical_index import BM25Index, reciprocal_rank_fusion
+
+# "chroma" (HNSW, default) or "numpy" (exact search, memory-mapped, no server/index build)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "chroma")
+RAG_BACKENDS = ("chroma", "numpy")
+
+# "hybrid" fuses BM25 keyword matches with vector similarity; "vector" is semantic only
+RAG_RETRIEVAL = os.getenv("RAG_RETRIEVAL", "hybrid")
+
+# The default embedding model is loaded once per process and shared by every RAGSystem
+_DEFAULT_EMBEDDING_FN = None
+_EMBEDDING_LOCK = threading.Lock()
+
+
+def default_embedding_fn():
+    global _DEFAULT_EMBEDDING_FN
+    if embedding_functions is None:
+        raise ImportError("chromadb is not installed; pass an embedding_fn to RAGSystem.")
+    with _EMBEDDING_LOCK:
+        if _DEFAULT_EMBEDDING_FN is None:
+            _DEFAULT_EMBEDDING_FN = embedding_functions.DefaultEmbeddingFunction()
+        return _DEFAULT_EMBEDDING_FN
 
 class RAGSystem:
-    def __init__(self, campaign_name="default", persist_directory="./data/chroma_db"):
+    # Seconds a query result stays valid when the collection is not written to
+    QUERY_CACHE_TTL = 30.0
+    QUERY_CACHE_SIZE = 256
+
+    def __init__(self, campaign_name="default", persist_directory="./data/chroma_db", backend=None, embedding_fn=None):
         self.persist_directory = persist_directory
         self.original_name = campaign_name
         self.campaign_name = self._sanitize_collection_name(campaign_name)
+        self.backend = (backend or RAG_BACKEND).lower()
+        if self.backend not in RAG_BACKENDS:
+            raise ValueError(f"Unknown RAG backend '{self.backend}' (expected one of {', '.join(RAG_BACKENDS)}).")
         
         # Ensure directory exists
         os.makedirs(persist_directory, exist_ok=True)
         
-        # Initialize Client
-        self.client = chromadb.PersistentClient(path=persist_directory)
-        
-        # Embedding Function
-        self.embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+        # Embedding Function (wrapped in a persistent cache keyed by text hash)
+        self.embedding_fn = embedding_fn if embedding_fn is not None else default_embedding_fn()
+        self.embedding_cache = EmbeddingCache(
+            os.path.join(persist_directory, "embedding_cache.sqlite"),
+            model_name=type(self.embedding_fn).__name__
+        )
+        self.embed = CachedEmbedder(self.embedding_fn, self.embedding_cache)
+
+        # Short-lived caches, dropped whenever the collection is written
+        self._count = None
+        self._query_cache = {}
+
+        # Keyword index over the stored documents, built on the first hybrid query
+        self.retrieval = RAG_RETRIEVAL.lower()
+        self.lexical = None
+        self._lexical_lock = threading.Lock()
         
         # Create or Get Collection (Using Sanitized Name)
-        print(f"[RAG] Initializing Collection: {self.campaign_name} (from '{self.original_name}')")
-        self.collection = self.client.get_or_create_collection(
-            name=self.campaign_name,
-            embedding_function=self.embedding_fn
-        )
+        print(f"[RAG] Initializing {self.backend} store: {self.campaign_name} (from '{self.original_name}')")
+        if self.backend == "numpy":
+            self.store = NumpyVectorStore(os.path.join(persist_directory, "numpy", self.campaign_name))
+        else:
+            self.store = ChromaVectorStore(persist_directory, self.campaign_name, self.embedding_fn)
+
+    @classmethod
+    def for_campaign(cls, campaign_data, campaign_name=None, persist_directory="./data/chroma_db"):
+        """Creates the store for a campaign, honouring its optional `rag_backend` field."""
+        campaign_name = campaign_name or campaign_data.get('title', 'default')
+        return cls(campaign_name, persist_directory, backend=campaign_data.get('rag_backend'))
         
     def _sanitize_collection_name(self, name):
         """
@@ -39,37 +94,203 @@ class RAGSystem:
         # Max length is 63, 'miskatonic_' takes 11, MD5 is 32 -> Total 43. Safe.
         return f"miskatonic_{hex_dig}"
 
+    @staticmethod
+    def memory_id(text):
+        """Content-addressed ID: the same text always maps to the same memory."""
+        return f"mem_{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+    def add_memories(self, texts, metadatas=None):
+        """
+        Adds many text snippets in bulk. IDs are content hashes, so text that is
+        already stored (or repeated within the batch) is skipped without re-embedding.
+        Returns the IDs of the newly inserted memories.
+        """
+        if metadatas is None:
+            metadatas = [None] * len(texts)
+
+        # De-duplicate within the batch, keeping the first occurrence
+        batch = {}
+        for text, metadata in zip(texts, metadatas):
+            if text:
+                batch.setdefault(self.memory_id(text), (text, metadata or None))
+        if not batch:
+            return []
+
+        added = []
+        ids = list(batch)
+        max_batch = self.store.max_batch_size
+        for start in range(0, len(ids), max_batch):
+            chunk_ids = ids[start:start + max_batch]
+            existing = self.store.existing_ids(chunk_ids)
+            new_ids = [doc_id for doc_id in chunk_ids if doc_id not in existing]
+            if not new_ids:
+                continue
+            documents = [batch[doc_id][0] for doc_id in new_ids]
+            chunk_metadatas = [batch[doc_id][1] for doc_id in new_ids]
+            self.store.upsert(new_ids, documents, self.embed(documents), chunk_metadatas)
+            if self.lexical is not None:
+                self.lexical.add_many(new_ids, documents, chunk_metadatas)
+            added.extend(new_ids)
+
+        if added:
+            self._invalidate_caches()
+
+        print(f"[RAG] Added {len(added)} memories ({len(batch) - len(added)} already stored)")
+        return added
+
     def add_memory(self, text, metadata=None):
-        """Adds a text snippet to the vector database."""
+        """Adds a text snippet to the vector database (no-op if already stored)."""
         if not text:
             return
-            
-        count = self.collection.count()
-        doc_id = f"mem_{count + 1}"
-        
-        if metadata is None:
-            metadata = {}
-            
-        self.collection.add(
-            documents=[text],
-            metadatas=[metadata],
-            ids=[doc_id]
-        )
-        print(f"[RAG] Added memory {doc_id}: {text[:50]}...")
+        self.add_memories([text], [metadata])
 
-    def query_memory(self, query_text, n_results=3):
-        """Retrieves relevant memories based on semantic similarity."""
-        if self.collection.count() == 0:
+    def ingest_campaign(self, campaign_data, campaign_id=None):
+        """Bulk-indexes a campaign's introduction, plot, scenes, clues, items and party in one call."""
+        texts, metadatas = [], []
+
+        def add(text, kind, **extra):
+            if isinstance(text, str) and text.strip():
+                texts.append(text.strip())
+                metadatas.append({"source": "campaign", "kind": kind, **extra})
+
+        add(campaign_data.get('introduction'), "introduction")
+        add(campaign_data.get('plot_outline'), "plot_outline")
+        for index, scene in enumerate(campaign_data.get('scenes', []) or []):
+            scene_id = str(scene.get('id', f"scene_{index}"))
+            add(scene.get('description'), "scene", scene_id=scene_id)
+            for clue in scene.get('clues', []) or []:
+                add(clue if isinstance(clue, str) else clue.get('description'), "clue", scene_id=scene_id)
+            for item in scene.get('items', []) or []:
+                if isinstance(item, dict):
+                    add(f"{item.get('name', '')}: {item.get('description', '')}", "item", scene_id=scene_id)
+                else:
+                    add(item, "item", scene_id=scene_id)
+        for member in campaign_data.get('ai_party', []) or []:
+            add(member.get('backstory'), "backstory", character=member.get('name', ''))
+
+        if campaign_id:
+            for metadata in metadatas:
+                metadata["campaign"] = campaign_id
+        return self.add_memories(texts, metadatas)
+
+    def ingest_messages(self, messages):
+        """Bulk-indexes a save's chat history (one memory per message)."""
+        texts, metadatas = [], []
+        for turn, message in enumerate(messages):
+            texts.append(message.get('content'))
+            metadata = {"source": "history", "role": message.get('role', ''), "turn": turn}
+            # Optional tags used by filtered queries
+            for key in ("scene_id", "character"):
+                if message.get(key):
+                    metadata[key] = str(message[key])
+            metadatas.append(metadata)
+        return self.add_memories(texts, metadatas)
+
+    def buffered_writer(self, flush_every=32, flush_interval=5.0):
+        """Returns a BufferedRAGWriter that batches add calls into this store."""
+        return BufferedRAGWriter(self, flush_every, flush_interval)
+
+    def _invalidate_caches(self):
+        self._count = None
+        self._query_cache.clear()
+
+    def count(self):
+        """Number of stored memories (cached until the next write)."""
+        if self._count is None:
+            self._count = self.store.count()
+        return self._count
+
+    def _lexical_index(self):
+        """Builds the BM25 index from the store once; later writes update it incrementally."""
+        with self._lexical_lock:
+            if self.lexical is None:
+                index = BM25Index()
+                documents = self.store.documents()
+                if documents:
+                    index.add_many(*zip(*documents))
+                self.lexical = index
+            return self.lexical
+
+    def query_memory(self, query_text, n_results=3, scene_id=None, character=None, turn_range=None, where=None):
+        """
+        Retrieves relevant memories. In hybrid mode, vector similarity and BM25 keyword
+        matches (names, items, Cantonese terms) are merged by reciprocal rank fusion.
+        `scene_id`, `character` and `turn_range` (inclusive (first, last) turn numbers)
+        filter inside the store; `where` accepts a raw filter (see build_where).
+        """
+        if where is None:
+            where = build_where(scene_id=scene_id, character=character, turn_range=turn_range)
+        key = (query_text, n_results, repr(where))
+        cached = self._query_cache.get(key)
+        if cached and time.time() - cached[0] < self.QUERY_CACHE_TTL:
+            return list(cached[1])
+
+        count = self.count()
+        if count == 0:
             return []
-            
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=min(n_results, self.collection.count())
-        )
-        
-        if results and 'documents' in results:
-            return results['documents'][0]
-        return []
+
+        if self.retrieval == "hybrid":
+            # Fetch a deeper candidate pool from each ranker before fusing
+            pool = min(max(n_results * 4, 20), count)
+            semantic = self.store.query(self.embed([query_text])[0], pool, where=where)
+            lexical = self._lexical_index().search(query_text, pool, where=where)
+            results = reciprocal_rank_fusion([semantic, lexical])[:n_results]
+        else:
+            results = self.store.query(self.embed([query_text])[0], min(n_results, count), where=where)
+        documents = [document for _, document, _, _ in results]
+
+        if len(self._query_cache) >= self.QUERY_CACHE_SIZE:
+            self._query_cache.clear()
+        self._query_cache[key] = (time.time(), documents)
+        return list(documents)
 
     def get_stats(self):
-        return f"Total Memories: {self.collection.count()}"
+        return f"Total Memories: {self.count()}"
+
+
+class BufferedRAGWriter:
+    """
+    Collects memories and writes them with one `add_memories` call every
+    `flush_every` items or `flush_interval` seconds, whichever comes first.
+    Use as a context manager or call `close()` to flush the remainder.
+    """
+    def __init__(self, rag, flush_every=32, flush_interval=5.0):
+        self.rag = rag
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, text, metadata=None):
+        if not text:
+            return
+        with self._lock:
+            self._pending.append((text, metadata))
+            full = len(self._pending) >= self.flush_every
+            if not full and self._timer is None and self.flush_interval:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Writes all pending memories now."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if pending:
+            texts, metadatas = zip(*pending)
+            self.rag.add_memories(list(texts), list(metadatas))
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
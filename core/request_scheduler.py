@@ -0,0 +1,256 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Exception class names raised by the SDKs/httpx for dropped or timed-out connections
+RETRYABLE_ERROR_NAMES = {
+    "APIConnectionError", "APITimeoutError", "ConnectError", "ConnectTimeout",
+    "ReadError", "ReadTimeout", "RemoteProtocolError", "PoolTimeout",
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while a provider's circuit breaker is open."""
+    pass
+
+
+def _status_code(error):
+    """Extracts an HTTP status from openai (status_code) or google-genai (code) errors."""
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(error):
+    """True for transient failures: rate limits, 5xx and connection problems."""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def retry_after_seconds(error):
+    """Reads Retry-After (seconds or HTTP date) / retry-after-ms from the error response."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms:
+            return float(ms) / 1000.0
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute`.
+    `reserve()` books capacity immediately and returns how long the caller
+    must wait, so concurrent bursts are spaced out instead of rejected.
+    """
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Deducts `amount` (capped at capacity) and returns the wait in seconds."""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive transient failures and rejects
+    calls for `reset_timeout` seconds, then lets a single trial call through.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Returns True if a call may proceed."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class RequestScheduler:
+    """
+    Per-provider request scheduler for LLM calls.
+    - Smooths bursts with request/min and token/min buckets (0 = unlimited).
+    - Retries transient errors with exponential backoff + full jitter, honouring Retry-After.
+    - Stops hammering a failing provider via a circuit breaker.
+    `sleep` / `clock` can be swapped out in tests.
+    """
+    def __init__(self, name="default", requests_per_minute=0, tokens_per_minute=0,
+                 max_retries=4, base_delay=1.0, max_delay=30.0,
+                 failure_threshold=5, reset_timeout=30.0,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.name = name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.request_bucket = TokenBucket(requests_per_minute, clock=clock) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, clock=clock) if tokens_per_minute else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock=clock)
+
+    def _rate_limit_delay(self, estimated_tokens):
+        delay = 0.0
+        if self.request_bucket:
+            delay = max(delay, self.request_bucket.reserve(1))
+        if self.token_bucket and estimated_tokens:
+            delay = max(delay, self.token_bucket.reserve(estimated_tokens))
+        return delay
+
+    def _backoff_delay(self, attempt, error):
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open; skipping request.")
+
+    def _on_error(self, attempt, error):
+        """Records the failure and returns the backoff delay, or re-raises if not retryable."""
+        if not is_retryable(error):
+            self.breaker.record_success()  # The provider answered; the request itself was bad
+            raise error
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            raise error
+        delay = self._backoff_delay(attempt, error)
+        logger.warning(f"[{self.name}] transient error ({error}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def run(self, call, estimated_tokens=0):
+        """Runs `call()` under rate limits, retries and the circuit breaker."""
+        attempt = 0
+        while True:
+            self._check_breaker()
+            wait = self._rate_limit_delay(estimated_tokens)
+            if wait:
+                self.sleep(wait)
+            try:
+                result = call()
+            except Exception as e:
+                self.sleep(self._on_error(attempt, e))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def arun(self, make_call, estimated_tokens=0):
+        """Async variant of `run`; `make_call()` must return a fresh awaitable per attempt."""
+        attempt = 0
+        while True:
+            self._check_breaker()
+            wait = self._rate_limit_delay(estimated_tokens)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                result = await make_call()
+            except Exception as e:
+                await asyncio.sleep(self._on_error(attempt, e))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+
+_SCHEDULERS = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def _provider_setting(provider, name, default):
+    """Reads e.g. OPENROUTER_REQUESTS_PER_MINUTE, falling back to LLM_REQUESTS_PER_MINUTE."""
+    return os.getenv(f"{provider.upper()}_{name}") or os.getenv(f"LLM_{name}") or default
+
+
+def get_scheduler(provider):
+    """Returns the process-wide scheduler for a provider, configured from env vars."""
+    with _SCHEDULERS_LOCK:
+        scheduler = _SCHEDULERS.get(provider)
+        if scheduler is None:
+            scheduler = RequestScheduler(
+                name=provider,
+                requests_per_minute=float(_provider_setting(provider, "REQUESTS_PER_MINUTE", "0")),
+                tokens_per_minute=float(_provider_setting(provider, "TOKENS_PER_MINUTE", "0")),
+                max_retries=int(_provider_setting(provider, "MAX_RETRIES", "4")),
+                base_delay=float(_provider_setting(provider, "RETRY_BASE_DELAY", "1.0")),
+                max_delay=float(_provider_setting(provider, "RETRY_MAX_DELAY", "30")),
+                failure_threshold=int(_provider_setting(provider, "CIRCUIT_THRESHOLD", "5")),
+                reset_timeout=float(_provider_setting(provider, "CIRCUIT_RESET", "30")),
+            )
+            _SCHEDULERS[provider] = scheduler
+        return scheduler
@@ -0,0 +1,58 @@
+import os
+import zlib
+import secrets
+
+import numpy as np
+
+from core.rules import d100_roll, check_success, sanity_check
+
+
+class RNGService:
+    """
+    Per-session source of randomness for every roll. Each investigator (and the
+    Keeper) gets an independent stream derived from the session seed and the
+    stream's name, so streams do not depend on creation order and one investigator's
+    rolls never shift another's. `get_state()` is JSON-serializable and restores the
+    exact position of every stream, so saved sessions replay deterministically.
+    """
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = os.getenv("RNG_SEED")
+        self.seed = int(seed) if seed is not None else secrets.randbits(64)
+        self._streams = {}
+
+    def stream(self, name="keeper"):
+        """numpy Generator for `name`, created on first use."""
+        generator = self._streams.get(name)
+        if generator is None:
+            sequence = np.random.SeedSequence(self.seed, spawn_key=(zlib.crc32(name.encode("utf-8")),))
+            generator = np.random.Generator(np.random.PCG64(sequence))
+            self._streams[name] = generator
+        return generator
+
+    def d100(self, name="keeper"):
+        return d100_roll(rng=self.stream(name))
+
+    def check(self, name, skill_level):
+        """check_success on `name`'s stream: (status, roll)."""
+        return check_success(skill_level, rng=self.stream(name))
+
+    def sanity(self, name, current_sanity, loss_value):
+        """sanity_check on `name`'s stream: (new_sanity, status, lost)."""
+        return sanity_check(current_sanity, loss_value, rng=self.stream(name))
+
+    def get_state(self):
+        return {
+            "seed": self.seed,
+            "streams": {name: gen.bit_generator.state for name, gen in self._streams.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Restores a `get_state()` snapshot; an empty/missing state starts a new seed."""
+        if not state or "seed" not in state:
+            return cls()
+        service = cls(state["seed"])
+        for name, bit_state in state.get("streams", {}).items():
+            service.stream(name).bit_generator.state = bit_state
+        return service
@@ -1,20 +1,240 @@
-import random
+import re
+import itertools
+from functools import lru_cache
 
-def d100_roll():
-    """Returns a random integer between 1 and 100."""
-    return random.randint(1, 100)
+import numpy as np
 
-def check_success(skill_level, roll_result=None):
+# Shared generator for rolls when the caller does not pass one (see core.rng.RNGService)
+_default_rng = np.random.default_rng()
+
+DICE_TOKEN_RE = re.compile(r"\s*(?:(\d*)[dD](\d+)(?:(kh|kl)(\d+))?|(\d+)|([-+*x×()]))")
+MAX_EXACT_OUTCOMES = 1_000_000  # Keep-highest/lowest pools larger than this can only be sampled
+
+
+class _Const:
+    def __init__(self, value):
+        self.value = value
+
+    def sample(self, n, rng):
+        return np.full(n, self.value, dtype=np.int64)
+
+    def pmf(self):
+        return self.value, np.ones(1)
+
+
+class _Dice:
+    """NdM, optionally keeping the highest/lowest K dice."""
+    def __init__(self, count, sides, keep=None, keep_count=None):
+        if count < 1 or sides < 1:
+            raise ValueError(f"Invalid dice: {count}d{sides}")
+        if keep and not 1 <= keep_count <= count:
+            raise ValueError(f"Invalid dice: {count}d{sides}{keep}{keep_count} must keep 1 to {count} dice")
+        self.count = count
+        self.sides = sides
+        self.keep = keep
+        self.keep_count = keep_count if keep else count
+
+    def sample(self, n, rng):
+        rolls = rng.integers(1, self.sides + 1, size=(n, self.count))
+        if self.keep and self.keep_count < self.count:
+            rolls.sort(axis=1)
+            rolls = rolls[:, -self.keep_count:] if self.keep == "kh" else rolls[:, :self.keep_count]
+        return rolls.sum(axis=1)
+
+    def pmf(self):
+        if not self.keep or self.keep_count == self.count:
+            die = np.ones(self.sides) / self.sides
+            probs = np.ones(1)
+            for _ in range(self.count):
+                probs = np.convolve(probs, die)
+            return self.count, probs
+        if self.sides ** self.count > MAX_EXACT_OUTCOMES:
+            raise ValueError(f"Too many outcomes for an exact distribution: {self.count}d{self.sides}")
+        rolls = np.array(list(itertools.product(range(1, self.sides + 1), repeat=self.count)))
+        rolls.sort(axis=1)
+        kept = rolls[:, -self.keep_count:] if self.keep == "kh" else rolls[:, :self.keep_count]
+        totals = kept.sum(axis=1)
+        low = self.keep_count
+        return low, np.bincount(totals - low) / len(totals)
+
+
+class _BinOp:
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def sample(self, n, rng):
+        left, right = self.left.sample(n, rng), self.right.sample(n, rng)
+        if self.op == "+":
+            return left + right
+        if self.op == "-":
+            return left - right
+        return left * right
+
+    def pmf(self):
+        left_low, left = self.left.pmf()
+        right_low, right = self.right.pmf()
+        if self.op == "+":
+            return left_low + right_low, np.convolve(left, right)
+        if self.op == "-":
+            return left_low - (right_low + len(right) - 1), np.convolve(left, right[::-1])
+        # '*': combine every pair of outcomes
+        values_l = np.arange(left_low, left_low + len(left))
+        values_r = np.arange(right_low, right_low + len(right))
+        values = values_l[:, None] * values_r[None, :]
+        low = int(values.min())
+        return low, np.bincount((values - low).ravel(), weights=np.outer(left, right).ravel())
+
+
+class DiceExpression:
+    """
+    Compiled dice expression such as '1d6+1', '2d6*5', '(2d6+6)*5' or '4d6kh3'.
+    Parse once with `compile_dice` (cached), then roll, roll in bulk from a
+    numpy Generator, or compute the exact distribution.
+    """
+    def __init__(self, source, tree):
+        self.source = source
+        self._tree = tree
+        self._pmf = None
+
+    def roll(self, rng=None):
+        return int(self._tree.sample(1, rng if rng is not None else _default_rng)[0])
+
+    def roll_many(self, n, rng=None):
+        """`n` independent results as an int64 array."""
+        return self._tree.sample(n, rng if rng is not None else _default_rng)
+
+    def pmf(self):
+        """Exact distribution as (lowest value, probabilities from that value up)."""
+        if self._pmf is None:
+            low, probs = self._tree.pmf()
+            nonzero = np.nonzero(probs > 1e-15)[0]
+            self._pmf = (low + int(nonzero[0]), probs[nonzero[0]:nonzero[-1] + 1])
+        return self._pmf
+
+    def distribution(self):
+        """Exact distribution as {value: probability}."""
+        low, probs = self.pmf()
+        return {low + i: float(p) for i, p in enumerate(probs) if p > 0}
+
+    @property
+    def min(self):
+        return self.pmf()[0]
+
+    @property
+    def max(self):
+        low, probs = self.pmf()
+        return low + len(probs) - 1
+
+    @property
+    def mean(self):
+        low, probs = self.pmf()
+        return float((np.arange(low, low + len(probs)) * probs).sum())
+
+    def __repr__(self):
+        return f"DiceExpression({self.source!r})"
+
+
+def _tokenize_dice(text):
+    tokens, pos = [], 0
+    text = text.strip()
+    while pos < len(text):
+        match = DICE_TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Invalid dice expression: {text!r}")
+        count, sides, keep, keep_count, number, symbol = match.groups()
+        if sides:
+            tokens.append(_Dice(int(count or 1), int(sides), keep, int(keep_count) if keep else None))
+        elif number:
+            tokens.append(_Const(int(number)))
+        elif symbol:
+            tokens.append("*" if symbol in "x×" else symbol)
+        pos = match.end()
+    return tokens
+
+
+def _parse_dice(tokens, text):
+    """Recursive descent: sum := product (('+'|'-') product)*; product := atom ('*' atom)*."""
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        if pos >= len(tokens):
+            raise ValueError(f"Incomplete dice expression: {text!r}")
+        pos += 1
+        return tokens[pos - 1]
+
+    def atom():
+        token = take()
+        if token == "(":
+            node = total()
+            if take() != ")":
+                raise ValueError(f"Unbalanced parentheses: {text!r}")
+            return node
+        if token == "-":
+            return _BinOp("-", _Const(0), atom())
+        if isinstance(token, (_Const, _Dice)):
+            return token
+        raise ValueError(f"Invalid dice expression: {text!r}")
+
+    def product():
+        node = atom()
+        while peek() == "*":
+            node = _BinOp(take(), node, atom())
+        return node
+
+    def total():
+        node = product()
+        while peek() in ("+", "-"):
+            node = _BinOp(take(), node, product())
+        return node
+
+    node = total()
+    if pos != len(tokens):
+        raise ValueError(f"Invalid dice expression: {text!r}")
+    return node
+
+
+@lru_cache(maxsize=512)
+def compile_dice(expr):
+    """Parses a dice expression once; repeated calls return the cached DiceExpression."""
+    text = str(expr)
+    return DiceExpression(text, _parse_dice(_tokenize_dice(text), text))
+
+
+@lru_cache(maxsize=512)
+def compile_loss(loss_value):
+    """
+    Compiles a SAN loss in success/failure notation: '0/1d3' -> (loss on success,
+    loss on failure). A single value ('1d6', 5) is lost on failure only.
+    """
+    text = str(loss_value).strip()
+    if "/" in text:
+        on_success, on_failure = text.split("/", 1)
+        return compile_dice(on_success.strip() or "0"), compile_dice(on_failure.strip())
+    return compile_dice("0"), compile_dice(text)
+
+
+def d100_roll(rng=None):
+    """Returns a random integer between 1 and 100 (from `rng`, a numpy Generator, if given)."""
+    return int((rng if rng is not None else _default_rng).integers(1, 101))
+
+def check_success(skill_level, roll_result=None, rng=None):
     """
     Checks if a skill roll is successful.
     Args:
         skill_level (int): The character's skill value (0-100).
         roll_result (int, optional): The dice roll. If None, rolls automatically.
+        rng (numpy.random.Generator, optional): Generator used for the automatic roll.
     Returns:
         tuple: (status_string, roll_result)
     """
     if roll_result is None:
-        roll_result = d100_roll()
+        roll_result = d100_roll(rng)
 
     # Fumble/Crit Logic (Simplified CoC 7e)
     if roll_result == 1:
@@ -34,28 +254,21 @@ def check_success(skill_level, roll_result=None):
     else:
         return 'Failure', roll_result
 
-def sanity_check(current_sanity, loss_value):
+def sanity_check(current_sanity, loss_value, rng=None):
     """
     Performs a Sanity Check.
     Args:
         current_sanity (int): The investigator's current SAN score.
-        loss_value (str or int): The SAN loss on failure (e.g., "1d4" or 5).
+        loss_value (str or int): The SAN loss, e.g. "1d4", 5 or "1/1d4" (success/failure).
+        rng (numpy.random.Generator, optional): Generator used for the check and the loss.
     Returns:
         tuple: (new_sanity, status, lost_amount)
     """
-    roll = d100_roll()
+    on_success, on_failure = compile_loss(loss_value)
+    roll = d100_roll(rng)
     status = "Success" if roll <= current_sanity else "Failure"
-    
-    loss = 0
-    if status == "Failure":
-        # Parse loss value (e.g., "1d6", "1/1d4", "5")
-        # For simplicity, if it's a string like "1d4", we roll it.
-        if isinstance(loss_value, str) and 'd' in loss_value:
-            num, sides = map(int, loss_value.split('d'))
-            loss = sum(random.randint(1, sides) for _ in range(num))
-        else:
-            loss = int(loss_value)
-    
+    loss = max(0, (on_success if status == "Success" else on_failure).roll(rng))
+
     new_sanity = max(0, current_sanity - loss)
     return new_sanity, status, loss
 
@@ -1 +1,236 @@
-# This file is currently not used as the scenario loading logic is within core/keeper.py
\ No newline at end of file
+import os
+import pickle
+import hashlib
+import threading
+from collections import deque
+
+import yaml
+
+# libyaml's C loader is ~10x faster than the pure-Python one; only needed on a rebuild
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+INDEX_VERSION = 1  # Bump when CampaignIndex changes shape; older sidecars are rebuilt
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Relative paths (the default or an env override) are under the project root, not the working directory
+CAMPAIGN_INDEX_DIR = os.path.join(PROJECT_DIR, os.getenv("CAMPAIGN_INDEX_DIR", os.path.join("data", "cache", "campaigns")))
+
+# Process-wide: abspath -> (mtime_ns, size, CampaignIndex), shared by every Keeper/session
+_LOADED_INDEXES = {}
+_LOADED_LOCK = threading.Lock()
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _normalize_clue(clue):
+    if isinstance(clue, dict):
+        return {
+            "description": str(clue.get("description", "")),
+            "skill_check": clue.get("skill_check"),
+            "success_outcome": clue.get("success_outcome"),
+            "failure_outcome": clue.get("failure_outcome"),
+        }
+    return {"description": str(clue), "skill_check": None, "success_outcome": None, "failure_outcome": None}
+
+
+def _normalize_item(item):
+    if isinstance(item, dict):
+        return {
+            "name": str(item.get("name", "")),
+            "description": item.get("description", ""),
+            "effect": item.get("effect"),
+        }
+    return {"name": str(item), "description": "", "effect": None}
+
+
+def _normalize_edge(edge):
+    if isinstance(edge, dict):
+        return {"target": str(edge.get("target", "")), "condition": edge.get("condition", "")}
+    return {"target": str(edge), "condition": ""}
+
+
+class CampaignIndex:
+    """
+    Compiled, read-only view of a scenario YAML: a scene graph with id lookup,
+    adjacency lists (`next_scenes` / `previous_scenes`), per-scene clue, item,
+    sanity-event and NPC tables, and the set of scenes reachable from each scene.
+    The raw campaign dict stays available as `data`.
+    """
+    def __init__(self, data):
+        self.data = data if isinstance(data, dict) else {}
+        self.title = self.data.get('title', 'Unknown Scenario')
+        self.introduction = self.data.get('introduction', '')
+
+        self.scene_order = []
+        self.scenes = {}
+        self.clues = {}
+        self.items = {}
+        self.sanity_events = {}
+        self.next_scenes = {}
+        self.npcs = {}
+        self.scene_npcs = {}
+
+        raw_scenes = [s for s in _as_list(self.data.get('scenes')) if isinstance(s, dict)]
+        for index, scene in enumerate(raw_scenes):
+            scene_id = str(scene.get('id', f"scene_{index}"))  # Same fallback ids as RAGSystem.ingest_campaign
+            self.scene_order.append(scene_id)
+            self.scenes[scene_id] = {
+                "id": scene_id,
+                "name": scene.get('name', scene_id),
+                "description": scene.get('description', ''),
+            }
+            self.clues[scene_id] = [_normalize_clue(c) for c in _as_list(scene.get('clues'))]
+            self.items[scene_id] = [_normalize_item(i) for i in _as_list(scene.get('items'))]
+            self.sanity_events[scene_id] = [e for e in _as_list(scene.get('sanity_events')) if isinstance(e, dict)]
+            self.next_scenes[scene_id] = [_normalize_edge(e) for e in _as_list(scene.get('next_scenes'))]
+
+        # Hand-written scenarios often list scenes without any edges: treat them as linear
+        if self.scene_order and not any(self.next_scenes.values()):
+            for current, following in zip(self.scene_order, self.scene_order[1:]):
+                self.next_scenes[current] = [{"target": following, "condition": ""}]
+
+        # Edges to unknown scene ids are kept out of the graph but reported
+        self.missing_targets = sorted({
+            edge["target"] for edges in self.next_scenes.values() for edge in edges
+            if edge["target"] not in self.scenes
+        })
+        self.previous_scenes = {scene_id: [] for scene_id in self.scene_order}
+        for scene_id in self.scene_order:
+            self.next_scenes[scene_id] = [e for e in self.next_scenes[scene_id] if e["target"] in self.scenes]
+            for edge in self.next_scenes[scene_id]:
+                self.previous_scenes[edge["target"]].append(scene_id)
+
+        self.start_scene = self.scene_order[0] if self.scene_order else None
+        self.reachable = {scene_id: self._walk(scene_id) for scene_id in self.scene_order}
+        self._index_npcs(raw_scenes)
+
+    def _walk(self, start):
+        """Breadth-first set of scene ids reachable from `start` (excluding itself unless on a cycle)."""
+        seen = set()
+        queue = deque(edge["target"] for edge in self.next_scenes[start])
+        while queue:
+            scene_id = queue.popleft()
+            if scene_id in seen:
+                continue
+            seen.add(scene_id)
+            queue.extend(edge["target"] for edge in self.next_scenes[scene_id])
+        return frozenset(seen)
+
+    def _index_npcs(self, raw_scenes):
+        """NPC roster by name, and per scene the NPCs it names, places there or mentions."""
+        roster = _as_list(self.data.get('npc_roster')) or _as_list(self.data.get('npcs'))
+        for npc in roster:
+            if isinstance(npc, dict) and npc.get('name'):
+                self.npcs[str(npc['name'])] = npc
+            elif isinstance(npc, str):
+                self.npcs[npc] = {"name": npc}
+
+        for scene_id, scene in zip(self.scene_order, raw_scenes):
+            names = [str(n.get('name') if isinstance(n, dict) else n) for n in _as_list(scene.get('npcs'))]
+            for name, npc in self.npcs.items():
+                if name in names:
+                    continue
+                placed = str(npc.get('location', npc.get('scene', ''))) == scene_id
+                if placed or name in str(scene.get('description', '')):
+                    names.append(name)
+            self.scene_npcs[scene_id] = names
+
+    def __len__(self):
+        return len(self.scene_order)
+
+    def __contains__(self, scene_id):
+        return scene_id in self.scenes
+
+    def scene(self, scene_id):
+        return self.scenes.get(scene_id)
+
+    def is_reachable(self, source, target):
+        return target in self.reachable.get(source, ())
+
+
+def _sidecar_path(campaign_file, cache_dir):
+    path_key = hashlib.sha1(os.path.abspath(campaign_file).encode('utf-8')).hexdigest()[:12]
+    base_name = os.path.splitext(os.path.basename(campaign_file))[0]
+    return os.path.join(cache_dir, f"{base_name}.{path_key}.index.pickle")
+
+
+def _read_sidecar_header(sidecar):
+    try:
+        with open(sidecar, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return None  # Missing, torn or foreign file: rebuilt from the YAML
+
+
+def _try_read_sidecar_index(sidecar):
+    try:
+        with open(sidecar, 'rb') as f:
+            pickle.load(f)  # Header
+            index = pickle.load(f)
+    except Exception as e:
+        # Also covers pickles of classes that were since moved or changed (ModuleNotFoundError, TypeError, ...)
+        print(f"[CAMPAIGN] Ignoring unreadable index cache {sidecar}: {e}")
+        return None
+    return index if isinstance(index, CampaignIndex) else None
+
+
+def _write_sidecar(sidecar, header, index):
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    tmp_file = f"{sidecar}.tmp"
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, sidecar)
+
+
+def load_campaign_index(campaign_file, cache_dir=None):
+    """
+    Returns the CampaignIndex for a scenario YAML, compiled once and cached in a
+    pickle sidecar (`CAMPAIGN_INDEX_DIR`). The sidecar is reused while the file's
+    mtime and size match, or its content hash does (e.g. after a touch/checkout);
+    otherwise the YAML is re-parsed and the sidecar rewritten.
+    Loaded indexes are also kept in memory for the whole process (treat them as read-only).
+    """
+    path = os.path.abspath(campaign_file)
+    stat = os.stat(path)
+    with _LOADED_LOCK:
+        loaded = _LOADED_INDEXES.get(path)
+    if loaded and loaded[:2] == (stat.st_mtime_ns, stat.st_size):
+        return loaded[2]
+
+    index = _load_campaign_index(campaign_file, stat, cache_dir)
+    with _LOADED_LOCK:
+        _LOADED_INDEXES[path] = (stat.st_mtime_ns, stat.st_size, index)
+    return index
+
+
+def _load_campaign_index(campaign_file, stat, cache_dir):
+    sidecar = _sidecar_path(campaign_file, cache_dir or CAMPAIGN_INDEX_DIR)
+    header = _read_sidecar_header(sidecar)
+    if not isinstance(header, dict) or header.get("version") != INDEX_VERSION:
+        header = None
+
+    if header and header["mtime_ns"] == stat.st_mtime_ns and header["size"] == stat.st_size:
+        index = _try_read_sidecar_index(sidecar)
+        if index is not None:
+            return index
+
+    with open(campaign_file, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha1(raw).hexdigest()
+    header_fresh = {"version": INDEX_VERSION, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": digest}
+
+    index = _try_read_sidecar_index(sidecar) if header and header["sha1"] == digest else None
+    if index is None:
+        index = CampaignIndex(yaml.load(raw, Loader=YamlLoader))
+    try:
+        _write_sidecar(sidecar, header_fresh, index)
+    except OSError as e:
+        print(f"[CAMPAIGN] Could not write index cache {sidecar}: {e}")
+    return index
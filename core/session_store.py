@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from core.state_manager import SaveStore
+from core.memory_system import FileMemoryBackend
+
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "data/saves/sessions.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    campaign TEXT NOT NULL,
+    slot TEXT NOT NULL DEFAULT 'default',
+    state TEXT NOT NULL DEFAULT '{}',
+    message_count INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    UNIQUE (campaign, slot)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    turn INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    extra TEXT,
+    PRIMARY KEY (session_id, turn)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agent_states (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (session_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS memories (
+    session_id INTEGER PRIMARY KEY REFERENCES sessions (id) ON DELETE CASCADE,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memory_journal (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS roll_log (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    turn INTEGER NOT NULL,
+    roller TEXT NOT NULL,
+    skill TEXT,
+    target INTEGER,
+    roll INTEGER NOT NULL,
+    result TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_roll_log_session_turn ON roll_log (session_id, turn);
+"""
+
+
+class StaleSessionError(Exception):
+    """Raised by Session.save when another writer saved the slot since this Session last loaded or saved it."""
+    pass
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class SessionStore:
+    """
+    One SQLite database (WAL mode) for every campaign's save slots: sessions, chat
+    messages, agent states, MemorySystem snapshots/journals and roll logs, keyed by
+    (session, turn). Writes are short `BEGIN IMMEDIATE` transactions, so several
+    stores (Streamlit sessions, processes) can write to the same file concurrently
+    while readers keep going.
+    """
+    def __init__(self, path=None):
+        self.path = path or SESSION_DB_PATH
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.RLock()
+        # Autocommit mode: transactions are opened explicitly in _write()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _write(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def list_sessions(self, campaign=None):
+        """[(campaign, slot, message_count, updated)], most recently played first."""
+        sql = "SELECT campaign, slot, message_count, updated FROM sessions"
+        params = ()
+        if campaign is not None:
+            sql += " WHERE campaign = ?"
+            params = (campaign,)
+        return self._read(sql + " ORDER BY updated DESC", params)
+
+    def list_slots(self, campaign):
+        return [row[1] for row in self.list_sessions(campaign)]
+
+    def open_session(self, campaign, slot="default", legacy_save=None, legacy_memory_dir=None):
+        """
+        Returns the Session for (campaign, slot), creating it if needed. A new session
+        imports `legacy_save` (a `<name>_save` JSON file or SaveStore directory path, without
+        extension) and `<campaign>_memory.*` files from `legacy_memory_dir` when they exist.
+        """
+        rows = self._read("SELECT id FROM sessions WHERE campaign = ? AND slot = ?", (campaign, slot))
+        if rows:
+            return Session(self, rows[0][0], campaign, slot, existed=True)
+
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO sessions (campaign, slot, created, updated) VALUES (?, ?, ?, ?)",
+                (campaign, slot, now, now),
+            )
+            session_id = conn.execute(
+                "SELECT id FROM sessions WHERE campaign = ? AND slot = ?", (campaign, slot)
+            ).fetchone()[0]
+        session = Session(self, session_id, campaign, slot, existed=False)
+        if legacy_save or legacy_memory_dir:
+            session.import_legacy(legacy_save, legacy_memory_dir)
+        return session
+
+
+class Session:
+    """
+    One save slot. Same interface as core.state_manager.SaveStore (load / save /
+    tail_messages / read_messages / history_len), plus roll logging and a
+    MemorySystem backend.
+    """
+    def __init__(self, store, session_id, campaign, slot, existed):
+        self.store = store
+        self.session_id = session_id
+        self.campaign = campaign
+        self.slot = slot
+        self._existed = existed
+        self.history_len = 0
+
+    def exists(self):
+        """True if this slot was already saved (or imported from a legacy save)."""
+        return self._existed
+
+    def load(self):
+        """Game state including per-agent states; also refreshes `history_len`."""
+        rows = self.store._read("SELECT state, message_count FROM sessions WHERE id = ?", (self.session_id,))
+        if not rows:
+            return {}
+        state = json.loads(rows[0][0])
+        self.history_len = rows[0][1]
+        agents = self.store._read("SELECT name, state FROM agent_states WHERE session_id = ?", (self.session_id,))
+        if agents:
+            state['agents'] = {name: json.loads(agent_state) for name, agent_state in agents}
+        return state
+
+    def save(self, state, messages, offset=0):
+        """
+        Inserts messages not yet saved and stores `state` in one transaction.
+        `messages` may be a tail window of the history starting at index `offset`.
+        The write is rejected with StaleSessionError if the slot's message count no
+        longer matches `history_len` (another tab, process or game saved it meanwhile),
+        rather than overwriting those turns.
+        """
+        state = dict(state)
+        state.pop('history', None)
+        agents = state.pop('agents', None) or {}
+        new_messages = messages[max(0, self.history_len - offset):]
+        first_turn = self.history_len
+        with self.store._write() as conn:
+            row = conn.execute("SELECT message_count FROM sessions WHERE id = ?", (self.session_id,)).fetchone()
+            if row is None or row[0] != first_turn:
+                raise StaleSessionError(
+                    f"{self.campaign}/{self.slot} was saved elsewhere ({row[0] if row else 0} messages, "
+                    f"this game expected {first_turn}); reload the slot to continue."
+                )
+            conn.executemany(
+                "INSERT INTO messages (session_id, turn, role, content, extra) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.session_id, first_turn + i, m.get('role', ''), str(m.get('content', '')),
+                     _dumps({k: v for k, v in m.items() if k not in ('role', 'content')}) if len(m) > 2 else None)
+                    for i, m in enumerate(new_messages)
+                ],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO agent_states (session_id, name, state) VALUES (?, ?, ?)",
+                [(self.session_id, name, _dumps(agent_state)) for name, agent_state in agents.items()],
+            )
+            conn.execute(
+                "UPDATE sessions SET state = ?, message_count = ?, updated = ? WHERE id = ?",
+                (_dumps(state), first_turn + len(new_messages), time.time(), self.session_id),
+            )
+        self.history_len = first_turn + len(new_messages)
+        self._existed = True
+
+    def _messages(self, where, params):
+        rows = self.store._read(
+            f"SELECT role, content, extra FROM messages WHERE session_id = ? AND {where} ORDER BY turn",
+            (self.session_id, *params),
+        )
+        messages = []
+        for role, content, extra in rows:
+            message = {'role': role, 'content': content}
+            if extra:
+                message.update(json.loads(extra))
+            messages.append(message)
+        return messages
+
+    def read_messages(self, start=0, stop=None):
+        """History messages [start:stop] (an index range scan on (session, turn))."""
+        stop = self.history_len if stop is None else min(stop, self.history_len)
+        if start >= stop:
+            return []
+        return self._messages("turn >= ? AND turn < ?", (start, stop))
+
+    def tail_messages(self, count):
+        """The last `count` messages."""
+        if count <= 0:
+            return []
+        return self._messages("turn >= ? AND turn < ?", (max(0, self.history_len - count), self.history_len))
+
+    def log_roll(self, roller, roll, skill=None, target=None, result=None, turn=None):
+        """Records a dice roll against the current turn (defaults to the history length)."""
+        with self.store._write() as conn:
+            conn.execute(
+                "INSERT INTO roll_log (session_id, turn, roller, skill, target, roll, result, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.session_id, self.history_len if turn is None else turn, roller, skill, target, roll, result, time.time()),
+            )
+
+    def roll_log(self, start_turn=0, stop_turn=None):
+        """[(turn, roller, skill, target, roll, result)] for turns in [start_turn, stop_turn)."""
+        return self.store._read(
+            "SELECT turn, roller, skill, target, roll, result FROM roll_log"
+            " WHERE session_id = ? AND turn >= ? AND turn < ? ORDER BY turn, id",
+            (self.session_id, start_turn, stop_turn if stop_turn is not None else 2 ** 62),
+        )
+
+    def memory_backend(self):
+        """Backend for MemorySystem.load_memory that keeps memory in this session."""
+        return SQLiteMemoryBackend(self.store, self.session_id)
+
+    def import_legacy(self, legacy_save=None, legacy_memory_dir=None):
+        """Copies a JSON / SaveStore save and `<campaign>_memory.*` files into this session."""
+        if legacy_save:
+            legacy = SaveStore(legacy_save)
+            if legacy.exists():
+                state = legacy.load()
+                messages = legacy.read_messages()
+                self.history_len = 0
+                self.save(state, messages)
+                print(f"[SESSIONS] Imported {legacy_save} ({len(messages)} messages) into {self.campaign}/{self.slot}")
+
+        if legacy_memory_dir:
+            files = FileMemoryBackend(legacy_memory_dir, self.campaign)
+            snapshot = files.read_snapshot()
+            backend = self.memory_backend()
+            if snapshot is not None and backend.read_snapshot() is None:
+                backend.write_snapshot(snapshot)
+                backend.append(list(files.read_ops()))
+                self._existed = True
+
+
+class SQLiteMemoryBackend:
+    """MemorySystem persistence in a session's `memories` / `memory_journal` rows."""
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+
+    def read_snapshot(self):
+        rows = self.store._read("SELECT data FROM memories WHERE session_id = ?", (self.session_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def write_snapshot(self, data):
+        """Replaces the snapshot and clears the journal in one transaction."""
+        with self.store._write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO memories (session_id, data) VALUES (?, ?)",
+                (self.session_id, _dumps(data)),
+            )
+            conn.execute("DELETE FROM memory_journal WHERE session_id = ?", (self.session_id,))
+
+    def append(self, ops):
+        with self.store._write() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO memory_journal (session_id, seq, op) VALUES (?, ?, ?)",
+                [(self.session_id, op.get("seq", 0), _dumps(op)) for op in ops],
+            )
+
+    def read_ops(self):
+        rows = self.store._read(
+            "SELECT op FROM memory_journal WHERE session_id = ? ORDER BY seq", (self.session_id,)
+        )
+        for (op,) in rows:
+            yield json.loads(op)
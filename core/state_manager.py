@@ -1,5 +1,27 @@
-import json
 import os
+import json
+import gzip
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Snapshot compression for SaveStore: none, gzip or zstd
+SAVE_COMPRESSION = os.getenv("SAVE_COMPRESSION", "none").lower()
+
+
+def _write_atomic(filename, data):
+    """Writes bytes to a temp file, fsyncs it and renames it over `filename`."""
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    tmp_file = f"{filename}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, filename)
+
 
 def load_game_state(filename='data/saves/game_state.json'):
     try:
@@ -10,13 +32,202 @@ def load_game_state(filename='data/saves/game_state.json'):
         return {}
 
 def save_game_state(game_state, filename='data/saves/game_state.json'):
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(game_state, f, indent=4, ensure_ascii=False)
+    _write_atomic(filename, json.dumps(game_state, indent=4, ensure_ascii=False).encode('utf-8'))
+
+
+class SaveStore:
+    """
+    Incremental save for one campaign, kept in a `<name>_save/` directory:
+      history.jsonl   append-only chat messages, one per line (never rewritten)
+      journal.jsonl   append-only log of the small game state (agents, queue, scene, RNG)
+      state.json      periodic snapshot of that state (optionally .gz / .zst), written
+                      atomically every `snapshot_every` saves, after which the journal is truncated
+    A save appends only the new messages and one journal line, so its cost does not grow
+    with the session. Each journal line records how many history lines were complete, so
+    a crash mid-write is rolled back to the last consistent save on load.
+    Legacy `<name>_save.json` files are migrated on first load.
+    """
+    def __init__(self, path, compression=None, snapshot_every=25):
+        self.path = path
+        self.legacy_file = f"{path}.json"
+        self.history_file = os.path.join(path, "history.jsonl")
+        self.journal_file = os.path.join(path, "journal.jsonl")
+        self.compression = (compression or SAVE_COMPRESSION).lower()
+        if self.compression == "zstd" and zstandard is None:
+            print("[SAVE] zstandard is not installed; using gzip")
+            self.compression = "gzip"
+        self.snapshot_every = snapshot_every
+
+        self.state = {}
+        self.history_len = 0
+        self._seq = 0
+        self._journal_entries = 0
+        self._lock = threading.RLock()
+
+    # --- SNAPSHOT ---
+
+    def _snapshot_file(self, compression):
+        suffix = {"gzip": ".gz", "zstd": ".zst"}.get(compression, "")
+        return os.path.join(self.path, f"state.json{suffix}")
+
+    def _write_snapshot(self):
+        data = json.dumps(
+            {"seq": self._seq, "history_len": self.history_len, "state": self.state},
+            ensure_ascii=False, default=str,
+        ).encode('utf-8')
+        if self.compression == "gzip":
+            data = gzip.compress(data)
+        elif self.compression == "zstd":
+            data = zstandard.ZstdCompressor().compress(data)
+        target = self._snapshot_file(self.compression)
+        _write_atomic(target, data)
+        # Drop snapshots left over from a different compression setting
+        for other in ("none", "gzip", "zstd"):
+            stale = self._snapshot_file(other)
+            if stale != target and os.path.exists(stale):
+                os.remove(stale)
+        open(self.journal_file, 'w').close()
+        self._journal_entries = 0
+
+    def _read_snapshot(self):
+        for compression in ("none", "gzip", "zstd"):
+            filename = self._snapshot_file(compression)
+            if not os.path.exists(filename):
+                continue
+            with open(filename, 'rb') as f:
+                data = f.read()
+            if compression == "gzip":
+                data = gzip.decompress(data)
+            elif compression == "zstd":
+                if zstandard is None:
+                    raise RuntimeError(f"{filename} needs the zstandard package")
+                data = zstandard.ZstdDecompressor().decompress(data)
+            return json.loads(data)
+        return None
+
+    # --- LOAD ---
+
+    def exists(self):
+        return os.path.isdir(self.path) or os.path.exists(self.legacy_file)
+
+    def load(self):
+        """Loads the game state (without history); returns {} for a new game."""
+        with self._lock:
+            # Re-run an interrupted migration too: the legacy file is only renamed at its end
+            if os.path.exists(self.legacy_file) and not os.path.exists(self.journal_file):
+                self._migrate_legacy()
+
+            snapshot = self._read_snapshot() if os.path.isdir(self.path) else None
+            if snapshot:
+                self._seq = snapshot.get("seq", 0)
+                self.history_len = snapshot.get("history_len", 0)
+                self.state = snapshot.get("state", {})
+
+            self._journal_entries = 0
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            break  # Torn write from a crash: everything before it is valid
+                        if entry.get("seq", 0) > self._seq:
+                            self._seq = entry["seq"]
+                            self.history_len = entry["history_len"]
+                            self.state = entry["state"]
+                        self._journal_entries += 1
+
+            self._truncate_history()
+            return dict(self.state)
+
+    def _truncate_history(self):
+        """Drops history lines written after the last completed save (crash recovery)."""
+        if not os.path.exists(self.history_file):
+            return
+        with open(self.history_file, 'rb+') as f:
+            for _ in range(self.history_len):
+                if not f.readline():
+                    break
+            f.truncate(f.tell())
+
+    def _migrate_legacy(self):
+        """Converts a legacy single-file `<name>_save.json` into the incremental layout."""
+        with open(self.legacy_file, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+        history = legacy.pop('history', [])
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.history_file, 'w', encoding='utf-8') as f:
+            f.write("".join(json.dumps(m, ensure_ascii=False, default=str) + "\n" for m in history))
+        self.history_len = len(history)
+        self.state = legacy
+        self._seq = 1
+        self._write_snapshot()
+        os.replace(self.legacy_file, f"{self.legacy_file}.migrated")
+        print(f"[SAVE] Migrated {self.legacy_file} ({len(history)} messages)")
+
+    def read_messages(self, start=0, stop=None):
+        """History messages [start:stop] of the last completed save."""
+        stop = self.history_len if stop is None else min(stop, self.history_len)
+        messages = []
+        if start >= stop or not os.path.exists(self.history_file):
+            return messages
+        with open(self.history_file, 'r', encoding='utf-8') as f:
+            for index, line in enumerate(f):
+                if index >= stop:
+                    break
+                if index >= start:
+                    messages.append(json.loads(line))
+        return messages
+
+    def tail_messages(self, count):
+        """The last `count` messages, read backwards from the end of the history file."""
+        if count <= 0 or not os.path.exists(self.history_file):
+            return []
+        wanted = min(count, self.history_len)
+        with open(self.history_file, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            position, data = end, b""
+            while position > 0 and data.count(b"\n") <= wanted:
+                step = min(64 * 1024, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+        lines = data.splitlines()
+        return [json.loads(line) for line in lines[-wanted:]] if wanted else []
+
+    # --- SAVE ---
+
+    def save(self, state, messages, offset=0):
+        """
+        Appends messages not yet saved and journals `state`.
+        `messages` may be a tail window of the history starting at index `offset`.
+        """
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            new_messages = messages[max(0, self.history_len - offset):]
+            if new_messages:
+                with open(self.history_file, 'a', encoding='utf-8') as f:
+                    f.write("".join(json.dumps(m, ensure_ascii=False, default=str) + "\n" for m in new_messages))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.history_len += len(new_messages)
+
+            self._seq += 1
+            self.state = state
+            entry = {"seq": self._seq, "history_len": self.history_len, "state": state}
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())  # Commit point: history lines above are now part of the save
+            self._journal_entries += 1
+            if self._journal_entries >= self.snapshot_every:
+                self._write_snapshot()
+
 
 if __name__ == '__main__':
     # Example usage
     initial_state = {'scene': 'Corbitt House Exterior', 'clues_found': []}
     save_game_state(initial_state)
     loaded_state = load_game_state()
-    print(f'Loaded game state: {loaded_state}')
\ No newline at end of file
+    print(f'Loaded game state: {loaded_state}')
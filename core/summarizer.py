@@ -0,0 +1,120 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.llm_client import is_system_error
+
+logger = logging.getLogger(__name__)
+
+# Background summarizer threads shared by every SummaryWorker in the process
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "2"))
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_executor():
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max(1, SUMMARY_WORKERS), thread_name_prefix="summarizer")
+        return _EXECUTOR
+
+
+SUMMARY_SYSTEM_PROMPT = """
+You are the chronicler of a Call of Cthulhu investigation.
+Summarize events faithfully and concisely in the language the transcript uses.
+Keep names, places, items, clues and unresolved threats. No commentary.
+"""
+
+
+class SummaryWorker:
+    """
+    Summarizes a MemorySystem's short-term buffer on a background thread.
+    `maybe_summarize()` returns immediately; the finished summary is committed to the
+    recent tier of the hierarchical memory, and tiers pushed out of it are condensed
+    by the LLM into a single bounded block. Only one job per worker runs at a time;
+    all workers share one small thread pool, so sessions do not each own a thread.
+    `on_summary(text)` is called on the worker thread with the memory's updated story
+    summary after each committed job.
+    """
+    def __init__(self, memory_system, llm_client, on_summary=None):
+        self.memory = memory_system
+        self.client = llm_client
+        self.on_summary = on_summary
+        self._future = None
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self):
+        return self._future is not None and not self._future.done()
+
+    def maybe_summarize(self):
+        """Schedules a summary if the buffer reached its threshold. Never blocks."""
+        with self._lock:
+            if self.busy or not self.memory.should_summarize():
+                return False
+            self._future = _get_executor().submit(self._summarize)
+            self._future.add_done_callback(self._on_done)
+            return True
+
+    def _on_done(self, future):
+        """Logs a failed job (nobody else awaits it) and hands a committed summary on."""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logger.error("Background summary failed", exc_info=error)
+            return
+        if future.result() and self.on_summary:
+            try:
+                self.on_summary(self.memory.get_story_summary())
+            except Exception:
+                logger.exception("on_summary callback failed")
+
+    def wait(self, timeout=None):
+        """Waits for the running job (e.g. before shutdown or in scripted runs); failures are only logged."""
+        future = self._future
+        if future is not None and not future.cancelled():
+            future.exception(timeout)
+
+    def _summarize(self):
+        """Returns True once a summary has been committed to memory."""
+        entries = self.memory.get_buffer_entries()
+        if not entries:
+            return False
+
+        summary = self.client.get_completion(
+            "Summarize these latest events of the session in at most 5 sentences:\n\n" + "\n".join(entries),
+            system_prompt=SUMMARY_SYSTEM_PROMPT,
+            temperature=0.3,
+            max_tokens=400
+        )
+        if not summary or is_system_error(summary):
+            logger.warning("Summarization failed; buffer kept for the next attempt.")
+            return False
+
+        condensed = None
+        overflow = self.memory.pending_overflow()
+        if overflow:
+            condensed = self._condense(overflow)
+
+        self.memory.commit_summary(summary.strip(), consumed=len(entries), condensed=condensed)
+        return True
+
+    def _condense(self, overflow):
+        """Merges the condensed block with summaries leaving the recent tier."""
+        older = self.memory.data["global_context"].get("summary", "")
+        limit = self.memory.max_summary_chars
+        text = self.client.get_completion(
+            f"Merge this story-so-far with the newer events into one chronological summary "
+            f"of at most {limit} characters. Compress the oldest parts the most.\n\n"
+            f"STORY SO FAR:\n{older}\n\nNEWER EVENTS:\n" + "\n".join(overflow),
+            system_prompt=SUMMARY_SYSTEM_PROMPT,
+            temperature=0.3,
+            max_tokens=600
+        )
+        if not text or is_system_error(text):
+            return None  # MemorySystem falls back to clipping
+        return text.strip()
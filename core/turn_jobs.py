@@ -0,0 +1,177 @@
+import os
+import time
+import logging
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Threads running Keeper/agent turns for every session in the process
+TURN_WORKERS = int(os.getenv("TURN_WORKERS", "4"))
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_executor():
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max(1, TURN_WORKERS), thread_name_prefix="turns")
+        return _EXECUTOR
+
+
+class TurnJob:
+    """
+    One queued turn. While it runs, `partial` holds the text streamed so far; once
+    finished, `status` is done / failed / cancelled and `result` or `error` is set.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, label, func, args, kwargs):
+        self.id = next(TurnJob._ids)
+        self.label = label
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = "queued"
+        self.partial = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+class TurnJobQueue:
+    """
+    Per-session FIFO of turns, run one at a time (they share the Keeper's story state)
+    on a process-wide thread pool. The Streamlit script only submits and polls, so it
+    never blocks on the LLM, and a rerun or closed tab does not lose an in-flight turn.
+    A job function receives its TurnJob first (to publish `partial` text) and persists
+    its own results. If it returns a dict with `halt` set, or raises, the jobs queued
+    behind it are cancelled. Finished jobs are handed to the UI by `collect()`.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._running = None
+        self._finished = []
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def busy(self):
+        return self._running is not None or bool(self._pending)
+
+    def pending_labels(self):
+        with self._lock:
+            return [job.label for job in self._pending]
+
+    def submit(self, label, func, *args, **kwargs):
+        """Queues `func(job, *args, **kwargs)` behind this session's other turns."""
+        job = TurnJob(label, func, args, kwargs)
+        with self._lock:
+            self._pending.append(job)
+            self._start_next()
+        return job
+
+    def _start_next(self):
+        if self._running is None and self._pending:
+            self._running = self._pending.popleft()
+            self._running.status = "running"
+            _get_executor().submit(self._run, self._running)
+
+    def _run(self, job):
+        try:
+            job.result = job.func(job, *job.args, **job.kwargs)
+            job.status = "done"
+        except Exception as e:
+            logger.exception("Turn job '%s' failed", job.label)
+            job.error = str(e)
+            job.status = "failed"
+        job.finished = time.time()
+
+        with self._lock:
+            self._finished.append(job)
+            self._running = None
+            if job.error or (isinstance(job.result, dict) and job.result.get("halt")):
+                self._cancel_pending()
+            self._start_next()
+        job._done.set()
+
+    def _cancel_pending(self):
+        while self._pending:
+            job = self._pending.popleft()
+            job.status = "cancelled"
+            job.finished = time.time()
+            self._finished.append(job)
+            job._done.set()
+
+    def cancel_pending(self):
+        """Cancels queued jobs; the running one (if any) still finishes and persists."""
+        with self._lock:
+            self._cancel_pending()
+
+    def collect(self):
+        """Finished jobs since the last call, oldest first."""
+        with self._lock:
+            finished, self._finished = self._finished, []
+        return finished
+
+    def wait(self, timeout=None):
+        """Waits until the queue is idle (e.g. in scripted runs); returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                job = self._running or (self._pending[-1] if self._pending else None)
+            if job is None:
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            job.wait(remaining)
+
+
+class Speculation:
+    """
+    Work started early on the shared turn pool, for inputs that may still change before
+    it is needed. `result(key)` returns the value only if it was computed for the same
+    `key`; otherwise (or if it failed) it is discarded and None tells the caller to
+    recompute. A speculation that has not started yet is cancelled rather than awaited,
+    so a full pool can never deadlock on it. `discard_reason` then says why: "stale"
+    (different key), "not started" or "failed".
+    """
+    def __init__(self, key, func, *args, **kwargs):
+        self.key = key
+        self.discard_reason = None
+        self.future = _get_executor().submit(func, *args, **kwargs)
+
+    def result(self, key):
+        if key != self.key:
+            self.future.cancel()
+            self.discard_reason = "stale"
+            return None
+        if self.future.cancel():
+            self.discard_reason = "not started"
+            return None
+        try:
+            return self.future.result()
+        except Exception:
+            logger.warning("Speculative job failed; recomputing", exc_info=True)
+            self.discard_reason = "failed"
+            return None
+
+    def discard(self):
+        self.future.cancel()
@@ -0,0 +1,351 @@
+import os
+import re
+import json
+import sqlite3
+import operator
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+# Chroma is optional: the NumPy backend works without it
+try:
+    import chromadb
+except ImportError:
+    chromadb = None
+
+
+# Filters use Chroma's `where` syntax so they pass through to Chroma unchanged:
+# {"field": value}, {"field": {"$gte": 3}}, {"$and": [...]}. Supported operators:
+WHERE_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<=", "$in": "IN"}
+FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def build_where(scene_id=None, character=None, turn_range=None, **fields):
+    """
+    Builds a metadata filter from the common RAG fields.
+    `turn_range` is an inclusive (first, last) tuple; either end may be None.
+    """
+    clauses = []
+    if scene_id is not None:
+        clauses.append({"scene_id": str(scene_id)})
+    if character is not None:
+        clauses.append({"character": character})
+    if turn_range is not None:
+        first, last = turn_range
+        if first is not None:
+            clauses.append({"turn": {"$gte": int(first)}})
+        if last is not None:
+            clauses.append({"turn": {"$lte": int(last)}})
+    clauses.extend({key: value} for key, value in fields.items() if value is not None)
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _conditions(where):
+    """Flattens a where clause into (field, operator, value) triples (all AND-ed)."""
+    for key, value in where.items():
+        if key == "$and":
+            for clause in value:
+                yield from _conditions(clause)
+        elif isinstance(value, dict):
+            for op, operand in value.items():
+                if op not in WHERE_OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+                yield key, op, operand
+        else:
+            yield key, "$eq", value
+
+
+_ORDERING = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+def match_where(metadata, where):
+    """Evaluates a where clause against one metadata dict (for in-memory filtering)."""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for field, op, operand in _conditions(where):
+        value = metadata.get(field)
+        if op == "$eq":
+            ok = value == operand
+        elif op == "$ne":
+            ok = value != operand
+        elif op == "$in":
+            ok = value in operand
+        elif value is None:
+            ok = False
+        else:
+            try:
+                ok = _ORDERING[op](value, operand)
+            except TypeError:
+                ok = False  # Not comparable (e.g. "3" vs 2): no match, like a missing field
+        if not ok:
+            return False
+    return True
+
+
+def where_to_sql(where):
+    """Translates a where clause to an SQLite condition over the JSON `metadata` column."""
+    sql, params = [], []
+    for field, op, operand in _conditions(where):
+        if not FIELD_RE.match(field):
+            raise ValueError(f"Invalid metadata field: {field}")
+        column = f"json_extract(metadata, '$.{field}')"
+        if op == "$in":
+            operand = list(operand)
+            sql.append(f"{column} IN ({','.join('?' * len(operand))})")
+            params.extend(operand)
+        elif op == "$ne":
+            # A missing field is "not equal" in match_where too (None != operand)
+            sql.append(f"({column} != ? OR {column} IS NULL)")
+            params.append(operand)
+        else:
+            condition = f"{column} {WHERE_OPERATORS[op]} ?"
+            json_types = _comparable_json_types(operand) if op in _ORDERING else None
+            if json_types:
+                # SQLite orders any number below any text; match_where treats that as no match
+                condition = f"json_type(metadata, '$.{field}') IN ({json_types}) AND {condition}"
+            sql.append(condition)
+            params.append(operand)
+    return " AND ".join(sql) or "1", params
+
+
+def _comparable_json_types(operand):
+    """JSON types Python can order against `operand` (SQL literal list), or None to not restrict."""
+    if isinstance(operand, (int, float)):
+        return "'integer', 'real', 'true', 'false'"
+    if isinstance(operand, str):
+        return "'text'"
+    return None
+
+
+class VectorStore(ABC):
+    """
+    Minimal interface RAGSystem needs from a vector database.
+    Embeddings are always computed by the caller (see CachedEmbedder), so a
+    backend only stores vectors, documents and metadata and ranks by similarity.
+    """
+    max_batch_size = 5000
+
+    @abstractmethod
+    def existing_ids(self, ids):
+        """Returns the subset of `ids` already stored."""
+
+    @abstractmethod
+    def upsert(self, ids, documents, embeddings, metadatas):
+        ...
+
+    @abstractmethod
+    def query(self, embedding, n_results, where=None):
+        """
+        Returns up to `n_results` (id, document, metadata, score) tuples, most similar first.
+        `where` (see build_where) restricts the search inside the store.
+        """
+
+    @abstractmethod
+    def documents(self):
+        """Returns every stored (id, document, metadata) (used to build the lexical index)."""
+
+    @abstractmethod
+    def count(self):
+        ...
+
+
+class ChromaVectorStore(VectorStore):
+    """Persistent ChromaDB collection (HNSW index)."""
+    def __init__(self, persist_directory, collection_name, embedding_fn=None):
+        if chromadb is None:
+            raise ImportError("chromadb is not installed; use RAG_BACKEND=numpy or `pip install chromadb`.")
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=embedding_fn
+        )
+        self.max_batch_size = self.client.get_max_batch_size()
+
+    def existing_ids(self, ids):
+        return set(self.collection.get(ids=list(ids), include=[])["ids"])
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        # Chroma rejects empty metadata dicts; None means "no metadata"
+        self.collection.upsert(
+            ids=list(ids),
+            documents=list(documents),
+            embeddings=[np.asarray(e, dtype=np.float32) for e in embeddings],
+            metadatas=[m or None for m in metadatas]
+        )
+
+    def query(self, embedding, n_results, where=None):
+        results = self.collection.query(
+            query_embeddings=[np.asarray(embedding, dtype=np.float32)],
+            n_results=n_results,
+            where=where or None,
+            include=["documents", "metadatas", "distances"]
+        )
+        if not results or not results.get("ids"):
+            return []
+        ids = results["ids"][0]
+        documents = results["documents"][0]
+        metadatas = results["metadatas"][0] if results.get("metadatas") else [None] * len(ids)
+        distances = results["distances"][0] if results.get("distances") else [0.0] * len(ids)
+        return [(i, d, m, -float(dist)) for i, d, m, dist in zip(ids, documents, metadatas, distances)]
+
+    def documents(self):
+        results = self.collection.get(include=["documents", "metadatas"])
+        return list(zip(results["ids"], results["documents"], results["metadatas"]))
+
+    def count(self):
+        return self.collection.count()
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Lightweight exact-search store for per-campaign memories.
+    - Vectors: L2-normalized float32 matrix in a memory-mapped file (`vectors.f32`),
+      grown by doubling, so a query is one matrix-vector product (cosine similarity).
+    - Top-k: `np.argpartition` (O(n)) followed by a sort of the k winners only.
+    - Documents/metadata: SQLite (`store.sqlite`), row number = matrix row.
+    """
+    def __init__(self, directory, initial_capacity=1024):
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.vector_file = os.path.join(directory, "vectors.f32")
+        self._conn = sqlite3.connect(os.path.join(directory, "store.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memories ("
+            " row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+        self._count = self._conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+        dim = self._conn.execute("SELECT value FROM info WHERE key = 'dim'").fetchone()
+        self.dim = int(dim[0]) if dim else None
+        self._matrix = None
+        if self.dim and os.path.exists(self.vector_file):
+            capacity = os.path.getsize(self.vector_file) // (4 * self.dim)
+            self._matrix = np.memmap(self.vector_file, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows, dim):
+        if self.dim is None:
+            self.dim = dim
+            self._conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('dim', ?)", (str(dim),))
+        elif dim != self.dim:
+            raise ValueError(f"Embedding dimension {dim} does not match store dimension {self.dim}.")
+
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(self.initial_capacity, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self.vector_file, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._matrix = np.memmap(self.vector_file, dtype=np.float32, mode="r+", shape=(new_capacity, self.dim))
+
+    def existing_ids(self, ids):
+        ids = list(ids)
+        found = set()
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT id FROM memories WHERE id IN ({placeholders})", chunk)
+                found.update(row[0] for row in rows)
+        return found
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or not len(vectors):
+            return
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+
+        with self._lock:
+            ids = list(ids)
+            existing = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                existing.update(self._conn.execute(
+                    f"SELECT id, row FROM memories WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+            rows = []
+            next_row = self._count
+            for doc_id in ids:
+                if doc_id in existing:
+                    rows.append(existing[doc_id])
+                else:
+                    existing[doc_id] = next_row
+                    rows.append(next_row)
+                    next_row += 1
+
+            self._ensure_capacity(next_row, vectors.shape[1])
+            self._matrix[rows] = vectors
+            self._matrix.flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO memories (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(row, doc_id, doc, json.dumps(meta, ensure_ascii=False) if meta else None)
+                 for row, doc_id, doc, meta in zip(rows, ids, documents, metadatas)]
+            )
+            self._conn.commit()
+            self._count = next_row
+
+    def query(self, embedding, n_results, where=None):
+        with self._lock:
+            if not self._count or n_results <= 0:
+                return []
+            query = np.asarray(embedding, dtype=np.float32)
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+            if where:
+                # Filter in SQLite first, then score only the matching rows
+                condition, params = where_to_sql(where)
+                candidates = np.fromiter(
+                    (row for (row,) in self._conn.execute(f"SELECT row FROM memories WHERE {condition}", params)),
+                    dtype=np.int64
+                )
+                if not len(candidates):
+                    return []
+                candidate_scores = self._matrix[candidates] @ query
+            else:
+                candidates = None
+                candidate_scores = self._matrix[:self._count] @ query
+
+            k = min(n_results, len(candidate_scores))
+            if k < len(candidate_scores):
+                top = np.argpartition(candidate_scores, -k)[-k:]
+            else:
+                top = np.arange(len(candidate_scores))
+            top = top[np.argsort(-candidate_scores[top])]
+
+            scores = {int(candidates[i] if candidates is not None else i): float(candidate_scores[i]) for i in top}
+            rows = list(scores)
+            placeholders = ",".join("?" * len(rows))
+            records = {
+                row: (doc_id, document, metadata)
+                for row, doc_id, document, metadata in self._conn.execute(
+                    f"SELECT row, id, document, metadata FROM memories WHERE row IN ({placeholders})", rows
+                )
+            }
+        results = []
+        for row in rows:
+            doc_id, document, metadata = records[row]
+            results.append((doc_id, document, json.loads(metadata) if metadata else None, scores[row]))
+        return results
+
+    def documents(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, document, metadata FROM memories ORDER BY row").fetchall()
+        return [(doc_id, document, json.loads(metadata) if metadata else None) for doc_id, document, metadata in rows]
+
+    def count(self):
+        return self._count
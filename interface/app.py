@@ -2,10 +2,9 @@ import os
 import sys
 import streamlit as st
 import yaml
-import json
 import time
 import re
-import random
+import threading
 from dotenv import load_dotenv
 
 # --- PATH SETUP ---
@@ -19,10 +18,10 @@ load_dotenv()
 
 # --- IMPORTS ---
 try:
-    from core.rules import d100_roll, check_success, sanity_check
-    from agents.player_agent import PlayerAgent
     from agents.scripter import Scripter
-    from core.keeper import Keeper
+    from core.game_session import GameSession
+    from core.session_store import SessionStore
+    from core.turn_jobs import TurnJobQueue
 except ImportError as e:
     st.error(f"Import Error: {e}")
     st.stop()
@@ -30,54 +29,201 @@ except ImportError as e:
 # ====================
 # HELPER FUNCTIONS
 # ====================
-def save_json(data, filepath):
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, default=str, ensure_ascii=False)
-
-def load_json(filepath):
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
 def load_yaml(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def _load_yaml_cached(filepath, mtime_ns):
+    return load_yaml(filepath)
+
+def load_hero(hero_path):
+    """Protagonist sheet, parsed once per file change instead of on every rerun."""
+    if not os.path.exists(hero_path):
+        return {}
+    return _load_yaml_cached(hero_path, os.stat(hero_path).st_mtime_ns) or {}
+
 def get_campaign_files():
     campaign_dir = os.path.join(parent_dir, 'data', 'campaigns')
     os.makedirs(campaign_dir, exist_ok=True)
     return [f for f in os.listdir(campaign_dir) if f.endswith('.yaml')]
 
-def get_save_filename(campaign_filename):
+# Chat rendering: messages shown per page, how many of those are full chat bubbles,
+# and the size of the cached blocks the older ones are collapsed into
+CHAT_WINDOW_MESSAGES = int(os.getenv("CHAT_WINDOW_MESSAGES", "40"))
+CHAT_LIVE_MESSAGES = int(os.getenv("CHAT_LIVE_MESSAGES", "8"))
+CHAT_BLOCK_MESSAGES = 20
+
+# Seconds between UI refreshes while Keeper/agent turns run in the background
+TURN_POLL_SECONDS = float(os.getenv("TURN_POLL_SECONDS", "0.5"))
+# Default for the "Auto-play Party Turns" sidebar toggle
+AUTO_PARTY_TURNS = os.getenv("AUTO_PARTY_TURNS", "0").lower() in ("1", "true", "yes")
+# In auto-play, draft the next companion's action while the Keeper resolves the current one
+SPECULATIVE_ACTIONS = os.getenv("SPECULATIVE_ACTIONS", "1").lower() in ("1", "true", "yes")
+
+# st.fragment (st.experimental_fragment before 1.37) reruns only the history view on "load earlier"
+_st_fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+fragment = _st_fragment or (lambda func: func)
+
+def polling_fragment(func):
+    """Reruns `func` every TURN_POLL_SECONDS as a fragment; without fragments the whole script polls."""
+    if _st_fragment:
+        return _st_fragment(func, run_every=TURN_POLL_SECONDS)
+    def poll():
+        func()
+        time.sleep(TURN_POLL_SECONDS)
+        st.rerun()
+    return poll
+
+def message_avatar(message):
+    role = message['role']
+    if role == 'agent':
+        return '🗣️'
+    if role == 'assistant':
+        return '🐙'
+    return message.get('avatar', None)
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def render_history_block(block):
+    """Markdown for a settled block of (avatar, content) messages; cached because it never changes."""
+    return "\n\n---\n\n".join(f"{avatar or '👤'} {content}" for avatar, content in block)
+
+def load_earlier_messages():
+    """Shows one more page of history, reading it from the save store if it is not in memory yet."""
+    game = st.session_state.game
+    st.session_state.chat_window = st.session_state.get('chat_window', CHAT_WINDOW_MESSAGES) + CHAT_WINDOW_MESSAGES
+    game.load_earlier(st.session_state.chat_window - len(game.messages))
+
+@fragment
+def render_chat_history():
+    """
+    Renders the last `chat_window` messages: the newest CHAT_LIVE_MESSAGES as chat bubbles,
+    the rest collapsed into cached markdown blocks aligned to absolute turn numbers
+    (finished blocks never change, so reruns hit the cache).
+    """
+    game = st.session_state.game
+    messages = game.messages
+    offset = game.history_offset
+    window = st.session_state.get('chat_window', CHAT_WINDOW_MESSAGES)
+    start = max(0, len(messages) - window)
+
+    hidden = offset + start
+    if hidden:
+        # Disabled while a turn is running: its save counts messages from `history_offset`
+        st.button(f"⬆ Load earlier ({hidden} more)", on_click=load_earlier_messages, disabled=get_turn_jobs().busy)
+
+    live_from = max(start, len(messages) - CHAT_LIVE_MESSAGES)
+    if live_from > start:
+        with st.expander(f"Earlier turns ({live_from - start})", expanded=False):
+            block_start = start
+            while block_start < live_from:
+                absolute = offset + block_start
+                block_end = min(live_from, block_start + CHAT_BLOCK_MESSAGES - absolute % CHAT_BLOCK_MESSAGES)
+                block = tuple((message_avatar(m), m['content']) for m in messages[block_start:block_end])
+                st.markdown(render_history_block(block))
+                block_start = block_end
+
+    for message in messages[live_from:]:
+        with st.chat_message(message['role'], avatar=message_avatar(message)):
+            st.markdown(message['content'])
+
+@st.cache_resource(show_spinner=False)
+def get_session_store():
+    """SQLite session store, one thread-safe connection shared by every browser session."""
+    return SessionStore(os.path.join(parent_dir, 'data', 'saves', 'sessions.sqlite'))
+
+@st.cache_resource(show_spinner=False)
+def get_scripter(provider, model_name):
+    """The Scripter is stateless (history is passed per call), so one instance serves all sessions."""
+    return Scripter(provider=provider, model_name=model_name)
+
+def get_save_store(campaign_filename, slot="default"):
+    """Save slot for a campaign; a new slot imports the campaign's old JSON save and memory files."""
     base_name = os.path.splitext(campaign_filename)[0]
     save_dir = os.path.join(parent_dir, 'data', 'saves')
-    os.makedirs(save_dir, exist_ok=True)
-    return os.path.join(save_dir, f"{base_name}_save.json")
+    legacy = os.path.join(save_dir, f"{base_name}_save") if slot == "default" else None
+    return get_session_store().open_session(
+        base_name, slot, legacy_save=legacy, legacy_memory_dir=save_dir if legacy else None
+    )
 
 def sanitize_filename(name):
     return re.sub(r'[\\/*?:"<>|]', "", name).strip().replace(" ", "_")
 
-def save_current_state(current_file):
-    if 'game_state' not in st.session_state:
-        st.session_state.game_state = {}
-        
-    st.session_state.game_state['history'] = st.session_state.messages
-    
-    # Save Agent States
-    agents_data = {}
-    if 'keeper' in st.session_state and st.session_state.keeper:
-        for agent in st.session_state.keeper.ai_party:
-            agents_data[agent.name] = {
-                'inventory': getattr(agent, 'inventory', []),
-                'stats': agent.stats, 
-            }
-    st.session_state.game_state['agents'] = agents_data
-    
-    # Save Turn Queue
-    if 'turn_queue' in st.session_state:
-        st.session_state.game_state['turn_queue'] = st.session_state.turn_queue
+def start_game(campaign_file, slot, enable_researcher=False):
+    """Opens the campaign's save slot (or a new game) as this browser session's GameSession."""
+    game = GameSession(
+        os.path.join(parent_dir, 'data', 'campaigns', campaign_file),
+        store=get_save_store(campaign_file, slot),
+        hero=load_hero(os.path.join(parent_dir, 'data', 'agents', 'protagonist.yaml')),
+        enable_researcher=enable_researcher,
+        memory_dir=os.path.join(parent_dir, 'data', 'saves'),
+    )
+    st.session_state.game = game
+    return game
 
-    save_path = get_save_filename(current_file)
-    save_json(st.session_state.game_state, save_path)
+# ====================
+# BACKGROUND TURNS
+# ====================
+# GameSession steps run on worker threads; the script thread is idle while they run and
+# only polls. Each step saves itself, so a rerun or closed tab does not lose it.
+
+def close_when_idle(jobs, game):
+    """Closes a replaced game once the turn it is still running has finished."""
+    jobs.wait()
+    game.close()
+
+def get_turn_jobs():
+    """This browser session's turn queue."""
+    if st.session_state.get('turn_jobs') is None:
+        st.session_state.turn_jobs = TurnJobQueue()
+    return st.session_state.turn_jobs
+
+def session_step_job(job, game, step, *args, **kwargs):
+    """Runs one GameSession step, publishing the Keeper's text to the job as it streams in."""
+    def publish(text):
+        job.partial = text
+    return getattr(game, step)(*args, on_chunk=publish, **kwargs)
+
+def submit_step(label, step, *args, **kwargs):
+    st.session_state.turn_error = None  # A new turn (or a retry) clears the last failure
+    return get_turn_jobs().submit(label, session_step_job, st.session_state.game, step, *args, **kwargs)
+
+def schedule_party_turns(agent_names):
+    """Queues each companion's turn, pipelined so each action is drafted during the previous resolution."""
+    for agent_name in agent_names:
+        submit_step(f"{agent_name} is acting...", 'agent_turn', agent_name=agent_name, speculate=SPECULATIVE_ACTIONS)
+
+def collect_turn_jobs():
+    """
+    Records failures of background turns finished since the last run in `turn_error`.
+    It stays shown (and auto-play stays paused) until the player retries or acts.
+    """
+    for job in get_turn_jobs().collect():
+        if job.error:
+            st.session_state.turn_error = f"{job.label} failed: {job.error}"
+        elif job.result and job.result.get('error'):
+            # The step kept nothing (e.g. a discuss is dropped whole if one companion failed)
+            who = job.result.get('agent')
+            st.session_state.turn_error = f"{who}: {job.result['error']}" if who else job.result['error']
+    if st.session_state.get('turn_error'):
+        st.error(st.session_state.turn_error)
+
+@polling_fragment
+def render_turn_jobs():
+    """Live view of the running turn; reruns the whole page once the queue is idle."""
+    jobs = get_turn_jobs()
+    job = jobs.running
+    if not jobs.busy:
+        st.rerun()
+    if job is not None:
+        with st.chat_message('assistant', avatar='🐙'):
+            if job.partial:
+                st.markdown(job.partial + " ▌")
+            else:
+                st.caption(f"⏳ {job.label}")
+    waiting = jobs.pending_labels()
+    if waiting:
+        st.caption("Up next: " + " · ".join(label.replace(" is acting...", "") for label in waiting))
 
 # ====================
 # MAIN UI
@@ -96,9 +242,8 @@ with tab1:
         
         # --- HERO CARD ---
         try:
-            hero_path = os.path.join(parent_dir, 'data', 'agents', 'protagonist.yaml')
-            if os.path.exists(hero_path):
-                hero_data = load_yaml(hero_path)
+            hero_data = load_hero(os.path.join(parent_dir, 'data', 'agents', 'protagonist.yaml'))
+            if hero_data:
                 with st.expander(f"🦸 {hero_data.get('name', 'Protagonist')}", expanded=True):
                     st.caption(f"**Occupation:** {hero_data.get('occupation', 'Investigator')}")
                     st.caption(f"**Gender:** {hero_data.get('gender', 'Unknown')}")
@@ -126,40 +271,59 @@ with tab1:
         else:
             selected_file = st.selectbox('Select Campaign', campaign_files)
 
+        # --- SAVE SLOTS ---
+        slots = []
+        if selected_file:
+            slots = get_session_store().list_slots(os.path.splitext(selected_file)[0])
+        slot_options = (slots or ["default"]) + ["➕ New slot"]
+        selected_slot = st.selectbox('Save Slot', slot_options)
+        if selected_slot == "➕ New slot":
+            selected_slot = st.text_input('New slot name', value=f"slot {len(slot_options)}").strip() or "default"
+
         ENABLE_RESEARCHER = st.checkbox('Enable Researcher', value=False)
         PROTAGONIST_MODE = st.checkbox('Solo Mode', value=True, help="Focuses narrative on YOU.")
+        AUTO_PARTY = st.checkbox('Auto-play Party Turns', value=AUTO_PARTY_TURNS,
+                                 help="Companions act automatically after your action, queued behind the Keeper.")
 
         if st.button("Apply / Restart Scenario", type="primary"):
-            if 'current_campaign_file' in st.session_state and 'game_state' in st.session_state:
-                save_current_state(st.session_state.current_campaign_file)
+            jobs = get_turn_jobs()
+            previous = st.session_state.get('game')
+            same_slot = (selected_file == st.session_state.get('current_campaign_file')
+                         and selected_slot == st.session_state.get('save_slot'))
+            if jobs.busy and same_slot:
+                # Reloading this slot: let the running turn save first, or the reloaded game would be stale
+                jobs.cancel_pending()
+                with st.spinner("Finishing the current turn..."):
+                    jobs.wait()
+            if jobs.busy:
+                # The running turn still finishes and saves into the previous game, then it is closed
+                jobs.cancel_pending()
+                st.session_state.turn_jobs = None
+                if previous is not None:
+                    threading.Thread(target=close_when_idle, args=(jobs, previous),
+                                     name="close-game", daemon=True).start()
+            elif previous is not None:
+                previous.save()
+                previous.close()
                 st.toast("Saved previous game.")
 
             st.session_state.current_campaign_file = selected_file
-            st.session_state.messages = []
-            st.session_state.keeper = None
-            st.session_state.turn_queue = []
-            st.session_state.pending_roll = False  # Reset roll state
-
-            new_save_path = get_save_filename(selected_file)
-            if os.path.exists(new_save_path):
-                try:
-                    st.session_state.game_state = load_json(new_save_path)
-                    st.session_state.messages = st.session_state.game_state.get('history', [])
-                    st.session_state.turn_queue = st.session_state.game_state.get('turn_queue', [])
-                    st.toast(f"Loaded save for {selected_file}")
-                except Exception:
-                    st.session_state.game_state = {}
+            st.session_state.save_slot = selected_slot
+            st.session_state.chat_window = CHAT_WINDOW_MESSAGES
+            st.session_state.turn_error = None
+            game = start_game(selected_file, selected_slot, ENABLE_RESEARCHER)
+            if game.loaded:
+                st.toast(f"Loaded save for {selected_file} ({selected_slot})")
             else:
-                st.session_state.game_state = {}
                 st.toast(f"Started new game: {selected_file}")
 
             st.rerun()
             
         # --- AI PARTY CARD ---
-        if 'keeper' in st.session_state and st.session_state.keeper and st.session_state.keeper.ai_party:
+        if st.session_state.get('game') is not None and st.session_state.game.keeper.ai_party:
             st.divider()
             st.subheader("👥 Party Members")
-            for agent in st.session_state.keeper.ai_party:
+            for agent in st.session_state.game.keeper.ai_party:
                 with st.expander(f"{agent.name} ({agent.gender})"):
                     st.caption(f"**Personality:** {agent.personality[:60]}...")
                     san = agent.stats.get('Sanity', 50)
@@ -180,39 +344,25 @@ with tab1:
         st.subheader(f"📖 {current_file.replace('.yaml', '').replace('_', ' ')}")
 
         try:
-            campaign_path = os.path.join(parent_dir, 'data', 'campaigns', current_file)
-            
-            if 'keeper' not in st.session_state or st.session_state.keeper is None:
-                st.session_state.keeper = Keeper(campaign_path, enable_researcher=ENABLE_RESEARCHER)
-                if 'game_state' in st.session_state:
-                    st.session_state.keeper.narrative_state = [
-                         {'description': m['content']} for m in st.session_state.messages if m['role'] == 'assistant'
-                    ]
-                    saved_agents = st.session_state.game_state.get('agents', {})
-                    for agent in st.session_state.keeper.ai_party:
-                        if agent.name in saved_agents:
-                            agent.inventory = saved_agents[agent.name].get('inventory', [])
-                            if 'stats' in saved_agents[agent.name]:
-                                agent.stats = saved_agents[agent.name]['stats']
-            else:
-                st.session_state.keeper.enable_researcher = ENABLE_RESEARCHER
-
-            # Display Chat
-            for message in st.session_state.messages:
-                role = message['role']
-                avatar = message.get('avatar', None)
-                if role == 'agent': avatar = '🗣️'
-                elif role == 'assistant': avatar = '🐙'
-                with st.chat_message(role, avatar=avatar):
-                    st.markdown(message['content'])
-
-            if 'turn_queue' not in st.session_state:
-                st.session_state.turn_queue = []
-            if 'pending_roll' not in st.session_state:
-                st.session_state.pending_roll = False
+            if st.session_state.get('game') is None:
+                start_game(current_file, st.session_state.get('save_slot', 'default'), ENABLE_RESEARCHER)
+            game = st.session_state.game
+            game.keeper.enable_researcher = ENABLE_RESEARCHER
+
+            # Report turns that failed in the background since the last run
+            collect_turn_jobs()
+
+            # Display Chat (windowed; earlier pages load on demand)
+            render_chat_history()
+
+            jobs = get_turn_jobs()
+
+            # --- BACKGROUND TURN IN PROGRESS: poll until it is saved ---
+            if jobs.busy:
+                render_turn_jobs()
 
             # --- INTERRUPT LOGIC: PENDING ROLL & NEGOTIATION ---
-            if st.session_state.pending_roll:
+            elif game.pending_roll:
                 st.divider()
                 st.warning("🎲 THE KEEPER DEMANDS A ROLL!")
                 
@@ -221,27 +371,7 @@ with tab1:
                 # --- OPTION 1: ACCEPT & ROLL ---
                 with col1:
                     if st.button("✅ Roll d100", type="primary"):
-                        roll_val = random.randint(1, 100)
-                        result_str = "Success" if roll_val <= 50 else "Failure" 
-                        roll_msg = f"🎲 **Result:** {roll_val} ({result_str})"
-                        
-                        st.session_state.messages.append({'role': 'user', 'content': roll_msg})
-                        
-                        # Feed result back to Keeper
-                        with st.spinner("Resolving fate..."):
-                            resolution = st.session_state.keeper.generate_narrative(f"Result: {roll_val}. Resolve the scene.")
-                        
-                        # Remove [ROLL_REQUIRED] tag if present in resolution to avoid loop
-                        resolution = resolution.replace("[ROLL_REQUIRED]", "")
-                        
-                        st.session_state.messages.append({'role': 'assistant', 'content': resolution, 'avatar': '🐙'})
-                        
-                        # Reset state
-                        st.session_state.pending_roll = False
-                        
-                        if st.session_state.turn_queue:
-                             st.session_state.turn_queue.pop(0)
-
+                        submit_step("The Keeper resolves the roll...", 'roll')
                         st.rerun()
 
                 # --- OPTION 2: NEGOTIATE / CHANGE SKILL ---
@@ -249,105 +379,57 @@ with tab1:
                     negotiate_text = st.text_input("Negotiate / Change Skill", placeholder="Can I use Fast Talk instead?")
                     if st.button("🤔 Negotiate"):
                         if negotiate_text:
-                            st.session_state.messages.append({'role': 'user', 'content': f"(Negotiating) {negotiate_text}"})
-                            
-                            with st.spinner("The Keeper considers..."):
-                                # Send negotiation to Keeper
-                                new_response = st.session_state.keeper.generate_narrative(f"Player asks: '{negotiate_text}'. Re-evaluate the skill check.")
-                            
-                            # Update UI
-                            if "[ROLL_REQUIRED]" in new_response:
-                                display_response = new_response.replace("[ROLL_REQUIRED]", "")
-                                st.session_state.messages.append({'role': 'assistant', 'content': display_response, 'avatar': '🐙'})
-                                st.session_state.pending_roll = True # Still pending (new roll)
-                            else:
-                                st.session_state.messages.append({'role': 'assistant', 'content': new_response, 'avatar': '🐙'})
-                                st.session_state.pending_roll = False # Negotiation ended the roll request (rare)
-                            
+                            submit_step("The Keeper considers...", 'negotiate', negotiate_text)
                             st.rerun()
 
 
             # --- NORMAL GAME LOGIC (Only if no pending roll) ---
-            elif not st.session_state.turn_queue:
+            elif not game.turn_queue:
                 # PLAYER TURN
                 col1, col2 = st.columns([8, 2])
                 with col2:
                     action_mode = st.radio("Phase", ["🎬 Action", "🗣️ Discuss"], label_visibility="collapsed")
                 
                 prompt_label = "What do you do?" if "Action" in action_mode else "Discuss plan..."
+                has_party = bool(game.keeper.ai_party)
 
                 # --- MANUAL END TURN BUTTON ---
-                if "Action" in action_mode and hasattr(st.session_state.keeper, 'ai_party') and st.session_state.keeper.ai_party:
+                if "Action" in action_mode and has_party:
                     if st.button("⏩ End Turn (Pass to Party)"):
-                        st.session_state.turn_queue = [agent.name for agent in st.session_state.keeper.ai_party]
+                        game.end_turn()
                         st.toast("Turn passed to AI Party...")
                         st.rerun()
 
                 if prompt := st.chat_input(prompt_label):
-                    st.session_state.messages.append({'role': 'user', 'content': prompt})
-                    with st.chat_message('user'):
-                        st.markdown(prompt)
-
                     if "Action" in action_mode:
-                        with st.spinner("The Keeper is watching..."):
-                            keeper_response = st.session_state.keeper.generate_narrative(prompt)
-
-                        # CHECK FOR ROLL REQUIREMENT
-                        if "[ROLL_REQUIRED]" in keeper_response:
-                            st.session_state.pending_roll = True
-                            display_response = keeper_response.replace("[ROLL_REQUIRED]", "")
-                            st.session_state.messages.append({'role': 'assistant', 'content': display_response, 'avatar': '🐙'})
-                            st.rerun()
-
-                        st.session_state.messages.append({'role': 'assistant', 'content': keeper_response, 'avatar': '🐙'})
-                        with st.chat_message('assistant', avatar='🐙'):
-                            st.markdown(keeper_response)
-                            
-                        save_current_state(current_file)
+                        # With auto-play, the companions act right after the Keeper unless a roll is demanded
+                        submit_step("The Keeper is writing...", 'player_action', prompt, then_party=AUTO_PARTY and has_party)
+                        if AUTO_PARTY and has_party:
+                            schedule_party_turns([agent.name for agent in game.keeper.ai_party])
                     else:
-                        with st.spinner("Discussing..."):
-                            if hasattr(st.session_state.keeper, 'ai_party'):
-                                for agent in st.session_state.keeper.ai_party:
-                                    response = agent.generate_dialogue(
-                                        user_input=prompt,
-                                        narrative_state=st.session_state.keeper.narrative_state
-                                    )
-                                    formatted_resp = f"**{agent.name}:** {response}"
-                                    st.session_state.messages.append({'role': 'agent', 'content': formatted_resp})
-                                    with st.chat_message('agent', avatar='🗣️'):
-                                        st.markdown(formatted_resp)
-                        save_current_state(current_file)
+                        submit_step("The party is discussing...", 'discuss', prompt)
+                    st.rerun()
             else:
                 # AGENT TURN
-                next_agent_name = st.session_state.turn_queue[0]
-                agent_obj = next((a for a in st.session_state.keeper.ai_party if a.name == next_agent_name), None)
+                next_agent_name = game.turn_queue[0]
                 
-                if agent_obj:
+                if AUTO_PARTY and st.session_state.get('turn_error'):
+                    # Do not call a failing provider again on every rerun: wait for the player
+                    st.divider()
+                    st.info(f"⏸ Auto-play paused at **{next_agent_name}'s** turn.")
+                    if st.button("🔁 Retry Party Turns"):
+                        schedule_party_turns(list(game.turn_queue))
+                        st.rerun()
+                elif AUTO_PARTY:
+                    # Remaining companions are queued back to back; a demanded roll cancels the rest
+                    schedule_party_turns(list(game.turn_queue))
+                    st.rerun()
+                else:
                     st.divider()
                     st.info(f"👉 It is **{next_agent_name}'s** turn.")
                     if st.button(f"▶ Process {next_agent_name}'s Action"):
-                        with st.spinner(f"{next_agent_name} is acting..."):
-                            action_intent = agent_obj.generate_action(st.session_state.keeper.narrative_state)
-                            st.session_state.messages.append({'role': 'agent', 'content': action_intent, 'avatar': '🗣️'})
-                            
-                            agent_resolution = st.session_state.keeper.generate_narrative(f"Resolution: {action_intent}")
-                            
-                            # CHECK FOR ROLL IN AGENT TURN
-                            if "[ROLL_REQUIRED]" in agent_resolution:
-                                st.session_state.pending_roll = True
-                                display_res = agent_resolution.replace("[ROLL_REQUIRED]", "")
-                                st.session_state.messages.append({'role': 'assistant', 'content': display_res, 'avatar': '🐙'})
-                                # Do NOT pop queue yet; wait for roll resolution
-                                st.rerun()
-
-                            st.session_state.messages.append({'role': 'assistant', 'content': agent_resolution, 'avatar': '🐙'})
-                            
-                            st.session_state.turn_queue.pop(0)
-                            save_current_state(current_file)
-                            st.rerun()
-                else:
-                    st.session_state.turn_queue.pop(0)
-                    st.rerun()
+                        submit_step(f"{next_agent_name} is acting...", 'agent_turn', agent_name=next_agent_name)
+                        st.rerun()
 
         except Exception as e:
             st.error(f"Game Error: {e}")
@@ -364,7 +446,8 @@ with tab2:
     st.caption(f"Powered by: {os.getenv('SCRIPTER_PROVIDER', 'Google').upper()}")
     
     if "scripter" not in st.session_state:
-        st.session_state.scripter = Scripter() # Uses env vars
+        st.session_state.scripter = get_scripter(os.getenv("SCRIPTER_PROVIDER", "google"),
+                                                 os.getenv("SCRIPTER_MODEL", "gemini-2.0-flash"))
         
     if "scripter_messages" not in st.session_state:
         st.session_state.scripter_messages = [{
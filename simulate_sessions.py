@@ -0,0 +1,176 @@
+"""
+Plays campaigns headlessly through core.game_session.GameSession, many sessions in
+parallel across worker processes, and reports per-step latency (p50/p95/max) by step
+kind. Use it to load-test an LLM provider or to regression-test a campaign end to end.
+
+    python simulate_sessions.py The_Haunting.yaml                       # 1 bot-driven session
+    python simulate_sessions.py The_Haunting.yaml --sessions 16 --workers 4 --turns 20
+    python simulate_sessions.py The_Haunting.yaml --script moves.yaml --expect-scene cellar
+
+A script is a YAML list of moves: plain strings are actions, or `{discuss: ...}`,
+`{negotiate: ...}` and `end_turn`.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import yaml
+import numpy as np
+from dotenv import load_dotenv
+
+# Ensure we can import from the project root
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+load_dotenv()
+
+from core.game_session import GameSession, ScriptedProtagonist, BotProtagonist
+from core.session_store import SessionStore
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+HERO_FILE = os.path.join(PROJECT_DIR, 'data', 'agents', 'protagonist.yaml')
+SIMULATION_DB = os.path.join(PROJECT_DIR, 'data', 'saves', 'simulations.sqlite')
+
+
+def load_yaml(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def resolve_campaign(campaign):
+    """Accepts a path or a file name in data/campaigns."""
+    if os.path.exists(campaign):
+        return campaign
+    path = os.path.join(PROJECT_DIR, 'data', 'campaigns', campaign)
+    if not os.path.exists(path):
+        raise SystemExit(f"Campaign not found: {campaign}")
+    return path
+
+
+def play_session(index, options):
+    """Plays one session to the end of its script (or bot budget); runs in a worker process."""
+    started = time.perf_counter()
+    steps = []
+    summary = {'session': index, 'steps': steps, 'error': None}
+    try:
+        hero = load_yaml(HERO_FILE) if os.path.exists(HERO_FILE) else {}
+        store = None
+        if options['db']:
+            campaign_name = os.path.splitext(os.path.basename(options['campaign']))[0]
+            store = SessionStore(options['db']).open_session(campaign_name, f"sim-{options['run_id']}-{index}")
+        seed = options['seed'] + index if options['seed'] is not None else None
+        game = GameSession(options['campaign'], store=store, hero=hero, seed=seed, write_behind=False)
+
+        if options['moves'] is not None:
+            protagonist = ScriptedProtagonist(options['moves'])
+        else:
+            protagonist = BotProtagonist(hero, max_actions=options['turns'])
+
+        for _ in range(options['max_steps']):
+            result = game.step(protagonist, speculate=options['speculate'])
+            if result is None:
+                break
+            steps.append({'kind': result['kind'], 'seconds': result['seconds'], 'error': result['error']})
+            if result['error']:
+                summary['error'] = result['error']
+                break
+        game.close()
+
+        summary.update(
+            scene=game.keeper.current_scene,
+            clues=len(game.keeper.discovered_clues),
+            messages=game.history_offset + len(game.messages),
+        )
+    except Exception as e:
+        summary['error'] = f"{type(e).__name__}: {e}"
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def latency_table(summaries):
+    """{kind: stats} over every step of every session."""
+    by_kind = {}
+    for summary in summaries:
+        for step in summary['steps']:
+            by_kind.setdefault(step['kind'], []).append(step['seconds'])
+    table = {}
+    for kind, seconds in sorted(by_kind.items()):
+        values = np.array(seconds)
+        table[kind] = {
+            'count': len(values),
+            'mean_s': float(values.mean()),
+            'p50_s': float(np.percentile(values, 50)),
+            'p95_s': float(np.percentile(values, 95)),
+            'max_s': float(values.max()),
+        }
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play campaigns headlessly and measure per-turn latency.")
+    parser.add_argument("campaign", help="Campaign YAML (path or file name in data/campaigns)")
+    parser.add_argument("--sessions", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: min(sessions, CPUs))")
+    parser.add_argument("--script", help="YAML list of protagonist moves (default: LLM-driven bot)")
+    parser.add_argument("--turns", type=int, default=10, help="Bot protagonist actions per session")
+    parser.add_argument("--max-steps", type=int, default=200, help="Safety cap on steps per session")
+    parser.add_argument("--speculate", action="store_true", help="Draft companion actions ahead (pipelined party)")
+    parser.add_argument("--seed", type=int, default=None, help="Dice seed of session 0 (session i uses seed + i)")
+    parser.add_argument("--db", default=SIMULATION_DB, help="SQLite file for the simulated saves")
+    parser.add_argument("--no-save", action="store_true", help="Do not save sessions at all")
+    parser.add_argument("--expect-scene", help="Exit with status 1 unless every session ends in this scene")
+    parser.add_argument("--json", help="Write per-session results and latency stats to this file")
+    args = parser.parse_args()
+
+    options = {
+        'campaign': resolve_campaign(args.campaign),
+        'moves': load_yaml(args.script) if args.script else None,
+        'turns': args.turns,
+        'max_steps': args.max_steps,
+        'speculate': args.speculate,
+        'seed': args.seed,
+        'db': None if args.no_save else args.db,
+        'run_id': uuid.uuid4().hex[:8],
+    }
+    workers = max(1, min(args.sessions, args.workers or os.cpu_count() or 1))
+    print(f"[SIM] {args.sessions} session(s) of {os.path.basename(options['campaign'])} "
+          f"on {workers} process(es), run {options['run_id']}")
+
+    started = time.perf_counter()
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_session, index, options) for index in range(args.sessions)]
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries.append(summary)
+            status = f"error: {summary['error']}" if summary['error'] else f"scene {summary.get('scene')}"
+            print(f"[SIM] session {summary['session']}: {len(summary['steps'])} steps "
+                  f"in {summary['seconds']:.1f}s, {status}")
+    elapsed = time.perf_counter() - started
+    summaries.sort(key=lambda summary: summary['session'])
+
+    table = latency_table(summaries)
+    print(f"\n{'step':>14} {'count':>6} {'mean s':>8} {'p50 s':>8} {'p95 s':>8} {'max s':>8}")
+    for kind, stats in table.items():
+        print(f"{kind:>14} {stats['count']:>6} {stats['mean_s']:>8.2f} {stats['p50_s']:>8.2f} "
+              f"{stats['p95_s']:>8.2f} {stats['max_s']:>8.2f}")
+    total_steps = sum(len(summary['steps']) for summary in summaries)
+    failed = [summary for summary in summaries if summary['error']]
+    print(f"\n{total_steps} steps in {elapsed:.1f}s ({total_steps / elapsed:.2f} steps/s), "
+          f"{len(failed)} session(s) with errors")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'options': options, 'latency': table, 'sessions': summaries}, f, ensure_ascii=False, indent=2)
+
+    if failed:
+        sys.exit(1)
+    if args.expect_scene and any(summary.get('scene') != args.expect_scene for summary in summaries):
+        print(f"[SIM] Not every session reached scene '{args.expect_scene}'")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+RequestScheduler against a local HTTP stub that speaks the OpenAI chat API, so the
+retry and circuit-breaker paths see the same SDK errors as a real provider sends.
+"""
+import os
+import sys
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI, AsyncOpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import request_scheduler
+from core.request_scheduler import RequestScheduler, CircuitOpenError
+
+COMPLETION = {
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "The door creaks open."}}],
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            status, headers = server.script.pop(0) if server.script else (200, {})
+        body = json.dumps(COMPLETION if status == 200 else {"error": {"message": f"stub {status}"}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """Answers each request with the next (status, headers) of `server.script`, then 200."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.script = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class FakeClock:
+    """Monotonic clock that only moves when the scheduler sleeps."""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_scheduler(clock, **kwargs):
+    settings = dict(max_retries=4, base_delay=0.01, max_delay=30.0, failure_threshold=5, reset_timeout=10.0)
+    settings.update(kwargs)
+    return RequestScheduler(name="stub", sleep=clock.sleep, clock=clock, **settings)
+
+
+def chat(client):
+    response = client.chat.completions.create(model="stub", messages=[{"role": "user", "content": "open"}])
+    return response.choices[0].message.content
+
+
+async def achat(client):
+    response = await client.chat.completions.create(model="stub", messages=[{"role": "user", "content": "open"}])
+    return response.choices[0].message.content
+
+
+def test_run_retries_429_then_5xx_and_honours_retry_after(stub_server):
+    stub_server.script = [(429, {"Retry-After": "3"}), (503, {})]
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    client = OpenAI(base_url=stub_server.base_url, api_key="stub", max_retries=0)
+
+    assert scheduler.run(lambda: chat(client)) == "The door creaks open."
+    assert stub_server.requests == 3
+    assert len(clock.sleeps) == 2
+    assert clock.sleeps[0] >= 3.0  # Retry-After wins over the tiny jittered backoff
+    assert clock.sleeps[1] <= 0.02  # No header on the 503: plain backoff
+    assert scheduler.breaker.state == "closed"
+
+
+def test_arun_retries_429_then_5xx_and_honours_retry_after(stub_server, monkeypatch):
+    stub_server.script = [(429, {"Retry-After": "2"}), (502, {})]
+    sleeps = []
+
+    async def record_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(request_scheduler.asyncio, "sleep", record_sleep)
+    scheduler = make_scheduler(FakeClock())
+
+    async def scenario():
+        client = AsyncOpenAI(base_url=stub_server.base_url, api_key="stub", max_retries=0)
+        try:
+            return await scheduler.arun(lambda: achat(client))
+        finally:
+            await client.close()
+
+    assert asyncio.run(scenario()) == "The door creaks open."
+    assert stub_server.requests == 3
+    assert len(sleeps) == 2
+    assert sleeps[0] >= 2.0
+    assert scheduler.breaker.state == "closed"
+
+
+def test_circuit_breaker_opens_then_closes_after_reset(stub_server):
+    stub_server.script = [(429, {"Retry-After": "1"}), (500, {})]
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, failure_threshold=2, reset_timeout=10.0)
+    client = OpenAI(base_url=stub_server.base_url, api_key="stub", max_retries=0)
+
+    # Two transient failures open the breaker; the third attempt never reaches the server
+    with pytest.raises(CircuitOpenError):
+        scheduler.run(lambda: chat(client))
+    assert stub_server.requests == 2
+    assert scheduler.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        scheduler.run(lambda: chat(client))
+    assert stub_server.requests == 2
+
+    # After the reset timeout one trial call goes through, and its success closes the breaker
+    clock.now += 10.0
+    assert scheduler.breaker.state == "half_open"
+    assert scheduler.run(lambda: chat(client)) == "The door creaks open."
+    assert stub_server.requests == 3
+    assert scheduler.breaker.state == "closed"
+
+
+def test_failed_trial_call_reopens_the_breaker(stub_server):
+    stub_server.script = [(503, {}), (503, {}), (503, {})]
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, failure_threshold=2, reset_timeout=10.0)
+    client = OpenAI(base_url=stub_server.base_url, api_key="stub", max_retries=0)
+
+    with pytest.raises(CircuitOpenError):
+        scheduler.run(lambda: chat(client))
+    clock.now += 10.0
+    with pytest.raises(CircuitOpenError):
+        scheduler.run(lambda: chat(client))
+    assert stub_server.requests == 3
+    assert scheduler.breaker.state == "open"